@@ -1,351 +1,392 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, Border, Side, PatternFill
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.worksheet.table import Table, TableStyleInfo
-import os, re
+import os
+import time
 import numpy as np
 
-
-# ── 전역 상수 ────────────────────────────────────────────────
-TABLE_SEQ = 0
-
-# 제외 조건 키워드
-EXCL_PAYMETHOD = "일시납"
-EXCL_GROUP_PATTERN = r"연금성|저축성"
-EXCL_STATUS_PATTERN = r"철회|해약|실효"
-
-# 환산 기준(%)
-RATE_LT10 = 50           # 10년납 미만
-RATE_LIFE_10P = 80       # 10년납 이상 생명보험
-RATE_NONLIFE_10P = 150   # 10년납 이상 손해보험
-
-
-# ── 유틸 ────────────────────────────────────────────────────
-def unique_sheet_name(wb, base, limit=31):
-    name = str(base)[:limit] if base else "Sheet"
-    if name not in wb.sheetnames:
-        return name
-    i = 2
-    while True:
-        suffix = f"_{i}"
-        trunc = limit - len(suffix)
-        cand = f"{name[:trunc]}{suffix}"
-        if cand not in wb.sheetnames:
-            return cand
-        i += 1
-
-
-def safe_table_name(base: str) -> str:
-    name = re.sub(r"[^A-Za-z0-9_]", "_", base)
-    if not re.match(r"^[A-Za-z_]", name):
-        name = f"tbl_{name}"
-    return name[:254]
-
-
-def header_idx(ws, name, default=None):
-    for i in range(1, ws.max_column + 1):
-        if ws.cell(row=1, column=i).value == name:
-            return i
-    return default
-
-
-def format_money(x):
-    try:
-        return f"{float(x):,.0f} 원"
-    except Exception:
-        return ""
+from excel_export import RESULT_SUFFIX, build_workbook, format_money, partition_by_collector, to_styled
+from incremental import ScoreState
+from ingest import COLUMNS_NEEDED, file_digest, load_contracts
+from instrument import LOG_PATH, Profiler, note_cache_miss, stage
+from jobs import Job
+from pipeline import (
+    REQUIRED_COLUMNS, build_excluded_with_reason, build_state, collector_keys, merge_contracts, missing_columns,
+    rank_collectors, rescore_incremental, score_contracts, select_collectors, sums, top3_tables,
+)
+from result_cache import RESULT_CACHE
+from rollups import FREQ_DAY, FREQ_WEEK, DailyRollup, build_rollup, rank_moves
+from rules import load_rules
 
 
-def autosize_columns_fast(ws, df: pd.DataFrame, padding=5, max_width=45):
+# ── 전역 상수 ────────────────────────────────────────────────
+# 제외 조건 / 보험구분 / 환산율은 rules.json(rules.py), 계산 단계는 pipeline.py 에서 관리
+
+# 엑셀 병렬 렌더링 작업 프로세스 수(1이면 순차)
+EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+# 계약 표(페이지 단위 표시): 한 페이지 행 수 / 정렬 기준(표시명 → 정렬 컬럼)
+GRID_PAGE_SIZES = [50, 100, 500, 1000]
+GRID_SORTS = {
+    "원본 순서": None,
+    "수금자명": "수금자명",
+    "계약일자": "계약일자",
+    "보험사": "보험사",
+    "실적보험료": "실적보험료",
+    "환산금액": "환산금액",
+}
+
+# 기간별 진행 현황: 단위 표시명 → 집계 단위 / 그래프에 그릴 기본 인원(기간 환산금액 상위)
+TREND_FREQS = {"일별": FREQ_DAY, "주별": FREQ_WEEK}
+TREND_TOP_N = 10
+
+# 백그라운드 작업: 진행 표시 갱신 간격(초) / 세션 상태 키 / 단계 표시명
+JOB_POLL_SECONDS = 0.5
+UPLOAD_JOB = "upload_job"
+EXPORT_JOB = "export_job"
+JOB_STAGE_LABELS = {
+    "load": "파일 읽기",
+    "score": "제외 판정·환산",
+    "rank": "순위 집계",
+    "index": "계약 표·기간 색인",
+    "export": "엑셀 생성",
+}
+
+
+# ── 데이터 로딩 (세션 공유 결과 캐시) ───────────────────────
+# 캐시 값은 세션끼리 같은 객체를 공유하므로 꺼낸 표를 제자리 수정하지 않음
+# cancel(threading.Event): 다른 세션이 같은 키를 계산하는 동안 기다리다가도 취소되면 멈춤
+def load_df_from_bytes(file_hash: str, file_bytes: bytes, cancel=None) -> pd.DataFrame:
     """
-    ✅ 전체 셀 스캔 대신:
-    - 헤더 + 상위 30행 샘플 기반 자동 너비 설정(빠름)
+    ✅ 디스크 컬럼 캐시(내용 해시) → XML 스트리밍 리더 → pd.read_excel 순서
+    - 서버 재시작/다른 인스턴스에서도 같은 파일은 다시 파싱하지 않음
+    - 결과 캐시는 메모리 단만 사용(디스크 단은 ingest 컬럼 캐시가 맡음)
     """
-    if df is None:
-        return
-    if df.empty:
-        for j, col in enumerate(df.columns, 1):
-            letter = ws.cell(row=1, column=j).column_letter
-            ws.column_dimensions[letter].width = min(max(len(str(col)) + padding, 10), max_width)
-        return
-
-    sample = df.head(30).astype(str)
-    for j, col in enumerate(df.columns, 1):
-        header_len = len(str(col))
-        sample_max = sample[col].map(len).max() if col in sample.columns else 0
-        width = min(max(header_len, sample_max) + padding, max_width)
-        letter = ws.cell(row=1, column=j).column_letter
-        ws.column_dimensions[letter].width = width
-
-
-# ── 데이터 로딩 (캐시) ───────────────────────────────────────
-@st.cache_data(show_spinner=False)
-def load_df_from_bytes(file_bytes: bytes) -> pd.DataFrame:
-    columns_needed = [
-        "수금자명", "계약일", "보험사", "상품명", "납입기간",
-        "초회보험료", "쉐어율", "납입방법", "상품군2", "계약상태"
-    ]
-    return pd.read_excel(BytesIO(file_bytes), usecols=columns_needed)
+    def compute():
+        note_cache_miss()
+        return load_contracts(file_bytes, COLUMNS_NEEDED)
+    return RESULT_CACHE.get_or_compute("load", (file_hash, COLUMNS_NEEDED), compute, disk=False, cancel=cancel)
 
 
-def exclude_contracts(df: pd.DataFrame):
+def load_merged(upload_hash: str, sources: list, cancel=None):
     """
-    제외: 일시납 / 연금성·저축성 / 철회·해약·실효
+    ✅ 여러 파일 업로드 → 중복 계약을 뺀 하나의 원본 + 파일별 현황(업로드 해시 단위 캐시)
+    - 파일마다 디스크 컬럼 캐시로 읽고 바로 걸러 합침(파일별 원본은 메모리 캐시에 남기지 않음)
     """
-    needed = {"납입방법", "상품군2", "계약상태"}
-    if not needed.issubset(df.columns):
-        return df.copy(), pd.DataFrame()
-
-    tmp = df.copy()
-    tmp["납입방법"] = tmp["납입방법"].astype(str).str.strip()
-    tmp["상품군2"] = tmp["상품군2"].astype(str).str.strip()
-    tmp["계약상태"] = tmp["계약상태"].astype(str).str.strip()
-
-    is_lumpsum = tmp["납입방법"].str.contains(EXCL_PAYMETHOD, na=False)
-    is_savings = tmp["상품군2"].str.contains(EXCL_GROUP_PATTERN, regex=True, na=False)
-    is_bad_status = tmp["계약상태"].str.contains(EXCL_STATUS_PATTERN, regex=True, na=False)
-
-    is_excluded = is_lumpsum | is_savings | is_bad_status
-    return tmp[~is_excluded].copy(), tmp[is_excluded].copy()
-
-
-def build_excluded_with_reason(exdf: pd.DataFrame) -> pd.DataFrame:
-    base_cols = ["수금자명", "계약일자", "보험사", "상품명", "납입기간", "보험료", "납입방법", "제외사유"]
-    if exdf is None or exdf.empty:
-        return pd.DataFrame(columns=base_cols)
-
-    tmp = exdf.copy()
+    def compute():
+        note_cache_miss()
+        return merge_contracts((name, load_contracts(data, COLUMNS_NEEDED)) for name, data in sources)
+    return RESULT_CACHE.get_or_compute("merge", (upload_hash, COLUMNS_NEEDED), compute, cancel=cancel)
 
-    def reason_row(row):
-        r = []
-        if EXCL_PAYMETHOD in str(row.get("납입방법", "")):
-            r.append("일시납")
-        if re.search(EXCL_GROUP_PATTERN, str(row.get("상품군2", ""))):
-            r.append("연금/저축성")
-        stt = str(row.get("계약상태", ""))
-        if "철회" in stt:
-            r.append("철회")
-        if "해약" in stt:
-            r.append("해약")
-        if "실효" in stt:
-            r.append("실효")
-        return " / ".join(r) if r else "제외 조건 미상"
 
-    tmp["제외사유"] = tmp.apply(reason_row, axis=1)
+def score_upload(file_hash: str, raw: pd.DataFrame, rules, prof=None, cancel=None):
+    """업로드 해시 + 규칙 지문 단위 캐시 → (유효 계약 점수표, 제외 계약)"""
+    def compute():
+        note_cache_miss()
+        return score_contracts(raw, rules, prof)
+    return RESULT_CACHE.get_or_compute("score", (file_hash, rules.fingerprint), compute, cancel=cancel)
 
-    out = tmp[["수금자명", "계약일", "보험사", "상품명", "납입기간", "초회보험료", "납입방법", "제외사유"]].copy()
-    out.rename(columns={"계약일": "계약일자", "초회보험료": "보험료"}, inplace=True)
 
-    out["계약일자"] = pd.to_datetime(out["계약일자"], errors="coerce").dt.strftime("%Y-%m-%d")
-    out["납입기간"] = out["납입기간"].apply(lambda x: f"{int(float(x))}년" if pd.notnull(x) else "")
-    out["보험료"] = out["보험료"].map(lambda x: f"{x:,.0f} 원" if pd.notnull(x) else "")
-    return out[base_cols]
-
-
-def classify_insurance_type(ins_series: pd.Series) -> pd.Series:
+# ── 화면 표 가공 ─────────────────────────────────────────────
+def grid_rows(df: pd.DataFrame, collector=None, insurers=None, date_range=None,
+              sort_by=None, ascending=True) -> pd.Index:
     """
-    손해: 손해/손보/화재/해상 포함
-    그 외: 생명보험
+    ✅ 계약 표 필터/정렬(숫자·날짜 컬럼 그대로 서버에서)
+    - 필터: 수금자 1명 / 보험사 목록 / 계약일자 (시작, 끝) — None 이면 적용 안 함
+    - 정렬은 정렬 컬럼 하나만 정렬해 행 순서(인덱스)만 얻음(행 전체 복사 없음)
     """
-    s = ins_series.astype(str).str.strip()
-    is_nonlife = s.str.contains(r"손해|손보|화재|해상", regex=True, na=False)
-    return np.where(is_nonlife, "손해보험", "생명보험")
-
+    mask = np.ones(len(df), dtype=bool)
+    if collector is not None:
+        mask &= collector_keys(df["수금자명"]) == collector
+    if insurers:
+        mask &= df["보험사"].isin(insurers).to_numpy()
+    if date_range is not None:
+        start, end = (pd.Timestamp(d) for d in date_range)
+        dates = df["계약일자"]
+        mask &= ((dates >= start) & (dates < end + pd.Timedelta(days=1))).to_numpy()
 
-@st.cache_data(show_spinner=False)
-def compute_manager_score(df_valid: pd.DataFrame) -> pd.DataFrame:
-    df = df_valid.copy()
-    df.rename(columns={"계약일": "계약일자", "초회보험료": "보험료"}, inplace=True)
+    rows = df.index if mask.all() else df.index[mask]
+    if sort_by is not None:
+        rows = df[sort_by].loc[rows].sort_values(ascending=ascending, kind="stable", na_position="last").index
+    return rows
 
-    df["납입기간_num"] = pd.to_numeric(df["납입기간"], errors="coerce").fillna(0).astype(int)
-    df["보험구분"] = classify_insurance_type(df["보험사"])
 
-    df["환산율"] = np.select(
-        [
-            df["납입기간_num"] < 10,
-            (df["납입기간_num"] >= 10) & (df["보험구분"] == "생명보험"),
-            (df["납입기간_num"] >= 10) & (df["보험구분"] == "손해보험"),
-        ],
-        [RATE_LT10, RATE_LIFE_10P, RATE_NONLIFE_10P],
-        default=0
-    ).astype(int)
+def grid_page(df: pd.DataFrame, rows: pd.Index, page: int, page_size: int) -> pd.DataFrame:
+    """보이는 페이지 행만 꺼내 표시용 문자열로 가공"""
+    start = (page - 1) * page_size
+    return to_styled(df.loc[rows[start:start + page_size]])
 
-    df["쉐어율"] = df["쉐어율"].apply(lambda x: float(str(x).replace("%", "")) if pd.notnull(x) else x)
-    df["실적보험료"] = pd.to_numeric(df["보험료"], errors="coerce").fillna(0)
-    df["환산금액"] = df["실적보험료"] * df["환산율"] / 100
-    df["계약일자_raw"] = pd.to_datetime(df["계약일자"], errors="coerce")
 
-    return df
+def collector_positions(state: ScoreState) -> dict:
+    """수금자명 → 계약 행 위치(정렬된 이름 순, 업로드당 한 번만 계산해 상태에 보관)"""
+    if state.positions is None:
+        state.positions = partition_by_collector(state.scored)
+    return state.positions
 
 
-# ── 요약/랭킹 ───────────────────────────────────────────────
-def make_group_with_ranks(df: pd.DataFrame) -> pd.DataFrame:
-    group = df.groupby("수금자명", dropna=False).agg(
-        건수=("수금자명", "size"),
-        실적보험료합계=("실적보험료", "sum"),
-        환산금액합계=("환산금액", "sum"),
-    ).reset_index()
+def collector_rollup(state: ScoreState) -> DailyRollup:
+    """수금자 × 일 합계(업로드당 한 번만 만들어 상태에 보관)"""
+    if state.rollup is None:
+        state.rollup = build_rollup(state.scored)
+    return state.rollup
 
-    group["환산금액순위"] = group["환산금액합계"].rank(method="dense", ascending=False).astype(int)
-    group["건수순위"] = group["건수"].rank(method="dense", ascending=False).astype(int)
 
-    group = group[["환산금액순위", "건수순위", "수금자명", "건수", "실적보험료합계", "환산금액합계"]]
-    group = group.sort_values(["환산금액순위", "건수순위", "수금자명"]).reset_index(drop=True)
-    return group
+def collector_rows(state: ScoreState, selected) -> pd.DataFrame:
+    """선택된 수금자의 계약 행(원본 순서, 전체 선택이면 복사 없이 그대로)"""
+    positions = collector_positions(state)
+    if len(selected) == len(positions):
+        return state.scored
+    pos = [positions[c] for c in selected if c in positions]
+    return state.scored.take(np.sort(np.concatenate(pos)) if pos else [])
 
 
-def top3_tables(group: pd.DataFrame):
+# ── 기간별 진행 현황 ─────────────────────────────────────────
+def trend_section(state: ScoreState, selected, prof: Profiler):
     """
-    ✅ 동률 포함 TOP3
-    - 환산TOP3: [환산금액순위, 수금자명, 환산금액합계]
-    - 건수TOP3: [건수순위, 수금자명, 건수]
+    ✅ 일별/주별 환산금액 · 누적 환산금액 · 순위 변동
+    - 업로드당 한 번 만든 수금자 × 일 합계에서만 계산 → 기간/단위를 바꿔도 계약 행을 다시 훑지 않음
     """
-    top_amt = group[group["환산금액순위"] <= 3].copy()
-    top_amt = top_amt.sort_values(["환산금액순위", "수금자명"])
-    top_amt = top_amt[["환산금액순위", "수금자명", "환산금액합계"]]
-
-    top_cnt = group[group["건수순위"] <= 3].copy()
-    top_cnt = top_cnt.sort_values(["건수순위", "수금자명"])
-    top_cnt = top_cnt[["건수순위", "수금자명", "건수"]]
-
-    return top_amt, top_cnt
-
-
-# ── 화면 표 가공 ─────────────────────────────────────────────
-def to_styled(df: pd.DataFrame) -> pd.DataFrame:
-    _ = df.copy()
-    _["계약일자"] = pd.to_datetime(_["계약일자"], errors="coerce").dt.strftime("%Y-%m-%d")
-    _["납입기간"] = _["납입기간_num"].astype(int).astype(str) + "년"
-    _["보험료"] = pd.to_numeric(_["보험료"], errors="coerce").fillna(0).map("{:,.0f} 원".format)
-    _["쉐어율"] = _["쉐어율"].astype(str) + " %"
-    _["실적보험료"] = _["실적보험료"].map("{:,.0f} 원".format)
-    _["환산율"] = _["환산율"].astype(str) + " %"
-    _["환산금액"] = _["환산금액"].map("{:,.0f} 원".format)
-
-    return _[
-        ["수금자명","계약일자","보험사","보험구분","상품명",
-         "납입기간","보험료","쉐어율","실적보험료","환산율","환산금액"]
-    ]
-
+    st.subheader("📅 기간별 진행 현황")
+    with prof.stage("build_rollup", len(state.scored)) as rec:
+        rollup = collector_rollup(state)
+        rec["rows_out"] = int(rollup.count.size)
+    if rollup.empty:
+        st.info("날짜로 인식된 계약이 없어 기간별 현황을 표시할 수 없습니다.")
+        return
 
-def sums(df: pd.DataFrame):
-    return float(df["실적보험료"].sum()), float(df["환산금액"].sum())
+    first, last = rollup.bounds
+    t1, t2, t3 = st.columns([1, 2, 1])
+    with t1:
+        freq = TREND_FREQS[st.radio("단위", list(TREND_FREQS), horizontal=True, key="trend_freq")]
+    with t2:
+        # 업로드마다 날짜 범위가 달라지므로 범위별 위젯 키
+        picked = st.date_input("기간", value=(first, last), min_value=first, max_value=last,
+                               key=f"trend_dates_{first}_{last}")
+    with t3:
+        top_n = st.number_input("그래프 인원(기간 환산금액 상위)", min_value=1, max_value=len(selected),
+                                value=min(TREND_TOP_N, len(selected)), key=f"trend_top_{len(selected)}")
+    start, end = picked if len(picked) == 2 else (first, last)
+
+    with prof.stage("rollup_queries", len(selected)) as rec:
+        window = rank_collectors(rollup.totals(selected, start, end))
+        shown = window["수금자명"].head(int(top_n))
+        per_period = rollup.series(shown, start, end, freq)
+        cumulative = rollup.series(shown, start, end, freq, cumulative=True)
+        moves = rank_moves(rollup.rank_history(selected, start, end, freq))
+        rec["rows_out"] = len(per_period)
+
+    st.markdown(f"#### 📈 누적 환산금액(상위 {len(shown)}명)")
+    st.line_chart(cumulative)
+    st.markdown("#### 📊 기간별 환산금액")
+    st.bar_chart(per_period)
+    st.markdown("#### 🔀 순위 변동(누적 환산금액, 선택 수금자 안에서)")
+    st.dataframe(moves, use_container_width=True)
+    if rollup.undated:
+        st.caption(f"계약일자가 날짜로 인식되지 않은 {rollup.undated:,}건은 기간별 현황에서 빠졌습니다.")
 
 
 # ── 엑셀 출력 ────────────────────────────────────────────────
-def write_table(ws, df_for_sheet: pd.DataFrame, start_row: int = 1, name_suffix: str = "A"):
-    global TABLE_SEQ
-    r_idx = start_row - 1
-
-    for r_idx, row in enumerate(dataframe_to_rows(df_for_sheet, index=False, header=True), start_row):
-        for c_idx, value in enumerate(row, 1):
-            cell = ws.cell(row=r_idx, column=c_idx, value=value)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-    end_col_letter = ws.cell(row=start_row, column=df_for_sheet.shape[1]).column_letter
-    last_row = r_idx if df_for_sheet.shape[0] > 0 else start_row
-
-    TABLE_SEQ += 1
-    display_name = safe_table_name(f"tbl_{ws.title}_{name_suffix}_{TABLE_SEQ}")
-
-    table = Table(displayName=display_name, ref=f"A{start_row}:{end_col_letter}{last_row}")
-    table.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws.add_table(table)
-
-    autosize_columns_fast(ws, df_for_sheet, padding=5)
-    return last_row
-
-
-def totals_block(ws, perf, score, start_row: int):
-    thin_border = Border(left=Side(style="thin"), right=Side(style="thin"),
-                         top=Side(style="thin"), bottom=Side(style="thin"))
-    fill = PatternFill("solid", fgColor="F2F2F2")
-
-    col_rate = header_idx(ws, "환산율", 1)
-    col_perf = header_idx(ws, "실적보험료", 2)
-    col_score = header_idx(ws, "환산금액", 3)
-
-    row = start_row + 2
-    ws.cell(row=row, column=col_rate, value="총 합계").alignment = Alignment(horizontal="center")
-
-    c1 = ws.cell(row=row, column=col_perf, value=f"{perf:,.0f} 원")
-    c2 = ws.cell(row=row, column=col_score, value=f"{score:,.0f} 원")
-    for c in (c1, c2):
-        c.font = Font(bold=True)
-        c.alignment = Alignment(horizontal="center")
-
-    for c in [col_rate, col_perf, col_score]:
-        cell = ws.cell(row=row, column=c)
-        cell.fill = fill
-        cell.border = thin_border
-
-    return row
-
-
-def build_workbook(df: pd.DataFrame, group: pd.DataFrame, excluded_disp_all: pd.DataFrame,
-                   top_amt: pd.DataFrame, top_cnt: pd.DataFrame):
-    wb = Workbook()
-    ws_summary = wb.active
-    ws_summary.title = "요약"
-
-    r = 1
-    ws_summary.cell(row=r, column=1, value="환산금액합계 TOP3(동률 포함)").font = Font(bold=True)
-    top_amt_x = top_amt.copy()
-    top_amt_x["환산금액합계"] = top_amt_x["환산금액합계"].map(format_money)
-    r = write_table(ws_summary, top_amt_x, start_row=r + 1, name_suffix="TOPAMT") + 2
-
-    ws_summary.cell(row=r, column=1, value="건수 TOP3(동률 포함)").font = Font(bold=True)
-    r = write_table(ws_summary, top_cnt.copy(), start_row=r + 1, name_suffix="TOPCNT") + 2
-
-    ws_summary.cell(row=r, column=1, value="수금자별 요약(전체)").font = Font(bold=True)
-
-    # ✅ 전체 요약표에서는 순위 컬럼 제거
-    summary_fmt = group.copy().drop(columns=["환산금액순위", "건수순위"], errors="ignore")
-    summary_fmt["실적보험료합계"] = summary_fmt["실적보험료합계"].map(format_money)
-    summary_fmt["환산금액합계"] = summary_fmt["환산금액합계"].map(format_money)
-    summary_fmt = summary_fmt.sort_values(["환산금액합계", "건수", "수금자명"], ascending=[False, False, True])
+def export_key(file_hash: str, selected_collectors, rules_fingerprint: str) -> tuple:
+    """
+    엑셀 결과 캐시 키: 업로드 내용 해시 + 선택 수금자 + 환산 규칙 해시
+    """
+    return (
+        file_hash,
+        tuple(sorted(str(c) for c in selected_collectors)),
+        rules_fingerprint,
+    )
 
-    r = write_table(ws_summary, summary_fmt, start_row=r + 1, name_suffix="SUM") + 1
 
-    if not excluded_disp_all.empty:
-        ws_summary.cell(row=r + 1, column=1, value="제외 계약 목록").font = Font(bold=True)
-        _ = write_table(ws_summary, excluded_disp_all, start_row=r + 2, name_suffix="EXC")
+def export_workbook_bytes(key: tuple, df: pd.DataFrame, group: pd.DataFrame, excluded_df: pd.DataFrame,
+                          top_amt: pd.DataFrame, top_cnt: pd.DataFrame, prof=None, cancel=None) -> bytes:
+    """
+    ✅ 엑셀 내보내기 단계
+    - key(export_key)만 캐시 키로 사용 → 같은 업로드/선택/기준이면 저장된 bytes 재사용(세션 공유)
+    - cancel(threading.Event): 켜지면 시트 사이 / 다른 세션의 같은 엑셀을 기다리던 중에 멈춤
+      (취소된 결과는 캐시에 남지 않음)
+    """
+    def compute():
+        note_cache_miss()
+        with stage(prof, "build_excluded_with_reason", len(excluded_df)):
+            excluded_disp_all = build_excluded_with_reason(excluded_df)
+        return build_workbook(df, group, excluded_disp_all, top_amt, top_cnt, workers=EXPORT_WORKERS, prof=prof,
+                              cancel=cancel)
+    return RESULT_CACHE.get_or_compute("export", key, compute, cancel=cancel)
 
-    # 수금자별 시트 생성(필터된 df 기준)
-    collectors = sorted(df["수금자명"].astype(str).unique().tolist())
-    for collector in collectors:
-        sub = df[df["수금자명"].astype(str) == collector].copy()
-        ws = wb.create_sheet(title=unique_sheet_name(wb, collector))
 
-        styled_sub = to_styled(sub)
-        table_last_row = write_table(ws, styled_sub, start_row=1, name_suffix="NORM")
+# ── 백그라운드 작업 ─────────────────────────────────────────
+def cancel_jobs(*state_keys):
+    """세션의 작업 취소 후 제거(새 업로드/업로드 해제 시)"""
+    for k in state_keys:
+        job = st.session_state.pop(k, None)
+        if job is not None:
+            job.cancel()
 
-        # 금액 컬럼 최소 너비
-        for header in ["실적보험료", "환산금액"]:
-            idx = header_idx(ws, header)
-            if idx:
-                col_letter = ws.cell(row=1, column=idx).column_letter
-                cur = ws.column_dimensions[col_letter].width
-                ws.column_dimensions[col_letter].width = 20 if (cur is None or cur < 20) else cur
 
-        perf, score = sums(sub)
-        next_row = totals_block(ws, perf, score, start_row=table_last_row)
+def upload_job(uploaded_files, file_hash: str, rules, incremental: bool, perf_enabled: bool) -> Job:
+    """
+    ✅ 업로드 1건: 읽기 → 제외 판정·환산 → 순위 → 계약 표·기간 색인을 백그라운드 작업으로(세션당 1개)
+    - 같은 업로드/규칙이면 진행 중이거나 끝난 작업을 그대로 사용
+    - 다른 파일을 올리면 이전 업로드 작업과 엑셀 작업을 취소하고 새로 시작
+    - 단계 함수는 세션 상태를 건드리지 않음(직전 상태는 시작할 때 넘겨 받음)
+    """
+    key = (file_hash, rules.fingerprint)
+    job = st.session_state.get(UPLOAD_JOB)
+    if job is not None and job.key == key:
+        return job
+    cancel_jobs(UPLOAD_JOB, EXPORT_JOB)
+
+    prev = st.session_state.get("score_state")
+    sources = [(f.name, f.getvalue()) for f in uploaded_files]
+    prof = Profiler(enabled=perf_enabled)
+    prof.context.update(file_hash=file_hash, files=len(sources))
+
+    def load(job):
+        if len(sources) == 1:
+            raw = prof.cached("load_df_from_bytes", load_df_from_bytes, file_hash, sources[0][1],
+                              job.cancel_event)
+            merged = (raw, None)
+        else:
+            merged = prof.cached("load_merged", load_merged, file_hash, sources, job.cancel_event)
+        prof.context["rows"] = len(merged[0])
+        return merged
+
+    def score(job):
+        """→ (상태, 변경 요약 또는 None, 직전 상태 재사용 여부), 필수 컬럼이 없으면 None"""
+        raw, _ = job.result("load")
+        if missing_columns(raw):
+            return None
+        # 직전 업로드 결과가 있으면 바뀐 행만 다시 계산(같은 파일/규칙이면 그대로 재사용)
+        if prev is not None and prev.file_hash == file_hash and prev.rules_fingerprint == rules.fingerprint:
+            return prev, None, True
+        if incremental and prev is not None:
+            with prof.stage("rescore_incremental", len(raw)) as rec:
+                state, changes = rescore_incremental(prev, file_hash, raw, rules)
+                rec["rows_out"] = len(state.scored)
+            return state, changes, False
+        scored, excluded = prof.cached("score_upload", score_upload, file_hash, raw, rules, prof,
+                                       job.cancel_event, rows_in=len(raw))
+        with prof.stage("build_state", len(raw)):
+            state = build_state(file_hash, raw, rules, scored, excluded)
+        return state, None, False
+
+    def rank(job):
+        """전체 수금자 순위 + TOP3(전체 선택일 때 그대로 사용)"""
+        if job.result("score") is None:
+            return None
+        state = job.result("score")[0]
+        with prof.stage("rank_collectors", len(state.agg)):
+            group = rank_collectors(state.agg)
+            return (group, *top3_tables(group))
+
+    def index(job):
+        """수금자별 행 위치 + 수금자 × 일 합계(업로드당 1회)"""
+        if job.result("score") is None:
+            return None
+        state = job.result("score")[0]
+        with prof.stage("collector_index", len(state.scored)):
+            collector_positions(state)
+            collector_rollup(state)
+
+    job = Job(key, [("load", load), ("score", score), ("rank", rank), ("index", index)], prof).start()
+    st.session_state[UPLOAD_JOB] = job
+    return job
+
+
+def export_job(key: tuple, show_df, group, excluded_df, top_amt, top_cnt, perf_enabled: bool) -> Job:
+    """엑셀 생성 작업(선택이 바뀌어 key 가 달라지면 이전 작업 취소)"""
+    job = st.session_state.get(EXPORT_JOB)
+    if job is not None and job.key == key:
+        return job
+    cancel_jobs(EXPORT_JOB)
+    prof = Profiler(enabled=perf_enabled)
+    prof.context["export_rows"] = len(show_df)
+
+    def export(job):
+        return prof.cached("export_workbook_bytes", export_workbook_bytes, key, show_df, group, excluded_df,
+                           top_amt, top_cnt, prof, job.cancel_event, rows_in=len(show_df))
+
+    job = Job(key, [("export", export)], prof).start()
+    st.session_state[EXPORT_JOB] = job
+    return job
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(state_key: str, seen: int):
+    """
+    작업 진행 막대(이 부분만 주기적으로 다시 그림)
+    - 화면이 그려진 뒤 새 단계가 끝났거나 작업이 끝나면 전체를 다시 그려 결과를 표시
+    """
+    job = st.session_state.get(state_key)
+    if job is None:
+        return
+    if len(job.finished) != seen or not job.running:
+        st.rerun()
+    label = JOB_STAGE_LABELS.get(job.current, job.current or "준비")
+    st.progress(job.progress, text=f"⏳ {label} 중… ({len(job.finished)}/{len(job.stages)}단계, "
+                                   f"{time.time() - job.started:,.0f}초)")
 
-        ex_sub = excluded_disp_all[excluded_disp_all["수금자명"].astype(str) == collector]
-        if not ex_sub.empty:
-            ws.cell(row=next_row + 2, column=1, value="제외 계약").font = Font(bold=True)
-            write_table(ws, ex_sub, start_row=next_row + 3, name_suffix="EXC")
 
-    return wb
+def job_error(job: Job, state_key: str, multi_file: bool = False):
+    """
+    실패한 작업 오류 표시 후 중단
+    - 실패한 작업은 세션에서 빼서 다음 실행 때 새로 시작(같은 입력이라도 다시 시도)
+    """
+    if st.session_state.get(state_key) is job:
+        del st.session_state[state_key]
+    if job.failed_stage == "load" and multi_file and isinstance(job.error, ValueError):
+        st.error(f"❌ 파일을 합칠 수 없습니다: {job.error}")
+    else:
+        label = JOB_STAGE_LABELS.get(job.failed_stage, job.failed_stage)
+        st.error(f"❌ {label} 단계에서 처리할 수 없습니다: {job.error}")
+    st.stop()
+
+
+# ── 성능 기록 ───────────────────────────────────────────────
+def perf_panel(prof: Profiler, jobs: dict = None):
+    """
+    사이드바 단계별 성능 표 + 결과 캐시 적중률/사용량(프로세스 누적)
+    - jobs: {표시명: 백그라운드 작업} — 작업 기록도 같은 표에(작업 컬럼으로 구분)
+    """
+    sources = {"화면": prof}
+    sources.update({name: job.prof for name, job in (jobs or {}).items() if job is not None and job.prof})
+    with st.sidebar.expander("⏱️ 단계별 성능", expanded=True):
+        rows = pd.DataFrame([{"작업": name, **rec} for name, p in sources.items() for rec in list(p.records)],
+                            columns=["작업", "stage", "depth", "seconds", "rows_in", "rows_out", "peak_mb", "cache"])
+        if rows.empty:
+            st.caption("기록된 단계가 없습니다.")
+        else:
+            rows["stage"] = ["　" * d + ("└ " if d else "") + name for d, name in zip(rows["depth"], rows["stage"])]
+            rows = rows.drop(columns=["depth"]).rename(columns={
+                "stage": "단계", "seconds": "초", "rows_in": "입력 행", "rows_out": "출력 행",
+                "peak_mb": "최대 메모리(MB)", "cache": "캐시",
+            })
+            rows["입력 행"] = rows["입력 행"].astype("Int64")
+            rows["출력 행"] = rows["출력 행"].astype("Int64")
+            rows["캐시"] = rows["캐시"].fillna("")
+            st.dataframe(rows.round({"초": 3, "최대 메모리(MB)": 1}), hide_index=True)
+
+        cache = RESULT_CACHE.stats()
+        if not cache.empty:
+            cache["적중률"] = cache["적중률"].map("{:.0%}".format)
+            st.dataframe(cache, hide_index=True)
+        usage = prof.context.get("result_cache") or RESULT_CACHE.usage()
+        st.caption(
+            f"결과 캐시: 메모리 {usage['memory_entries']}개 {usage['memory_mb']:,.0f}/{usage['memory_budget_mb']:,.0f} MB"
+            f" · 디스크 {usage['disk_entries']}개 {usage['disk_mb']:,.0f}/{usage['disk_budget_mb']:,.0f} MB"
+        )
+        st.caption(f"로그: {LOG_PATH}")
 
 
 # ── 메인 ────────────────────────────────────────────────────
 def run():
     st.set_page_config(page_title="매니저 업적 환산기", layout="wide")
 
+    try:
+        rules = load_rules()
+    except (OSError, ValueError, KeyError, TypeError) as err:
+        st.error(f"❌ 환산 규칙 파일(rules.json)을 읽을 수 없습니다: {err}")
+        st.stop()
+
     with st.sidebar:
         st.header("🧭 사용 방법")
         st.markdown(
@@ -359,52 +400,104 @@ def run():
         )
         st.divider()
         st.markdown(
-            f"""
-            **📌 환산 기준**  
-            - 10년납 미만: **{RATE_LT10}%**  
-            - 10년납 이상(생명): **{RATE_LIFE_10P}%**  
-            - 10년납 이상(손해): **{RATE_NONLIFE_10P}%**
-            """
+            f"**📌 환산 기준** ({rules.version})  \n"
+            + "  \n".join(f"- {line}" for line in rules.describe())
+        )
+        st.markdown("**🚫 제외 기준**  \n- " + " / ".join(rules.exclusion_labels))
+        st.divider()
+        incremental = st.checkbox(
+            "🔄 증분 재계산",
+            value=True,
+            help="새로 올린 파일을 직전 업로드와 비교해 추가/삭제/변경된 계약만 다시 계산합니다.",
+        )
+        perf_enabled = st.checkbox(
+            "⏱️ 단계별 성능 기록",
+            value=False,
+            help="단계별 시간/행 수/메모리와 캐시 적중을 사이드바에 표시하고 로그 파일에 남깁니다.",
         )
-        st.markdown("**🚫 제외 기준**  \n- 일시납 / 연금성·저축성 / 철회·해약·실효")
+
+    prof = Profiler(enabled=perf_enabled)
+    try:
+        run_main(rules, incremental, prof, perf_enabled)
+    finally:
+        if prof.enabled:
+            prof.context["result_cache"] = RESULT_CACHE.usage()
+            prof.log()
+            perf_panel(prof, {"업로드": st.session_state.get(UPLOAD_JOB),
+                              "엑셀": st.session_state.get(EXPORT_JOB)})
+
+
+def run_main(rules, incremental: bool, prof: Profiler, perf_enabled: bool = False):
+    """
+    업로드 → (백그라운드) 읽기/환산/순위/색인 → 총합 → 순위 → 계약 표/기간 → 엑셀
+    - 무거운 단계는 작업 스레드에서, 화면은 끝난 단계 결과부터 그림(화면 단계는 prof 에 기록)
+    """
 
     st.title("🏆 매니저 업적 환산기")
     st.caption("여러 명 선택 가능 · 선택된 수금자만 합산 결과/요약/엑셀로 출력합니다.")
 
-    uploaded_file = st.file_uploader("📂 계약 목록 Excel 파일 업로드 (.xlsx)", type=["xlsx"])
-    if not uploaded_file:
+    uploaded_files = st.file_uploader(
+        "📂 계약 목록 Excel 파일 업로드 (.xlsx, 지점별 여러 개 가능)", type=["xlsx"], accept_multiple_files=True
+    )
+    if not uploaded_files:
+        cancel_jobs(UPLOAD_JOB, EXPORT_JOB)
         st.info("📤 계약 목록 Excel 파일(.xlsx)을 업로드해주세요.")
         return
 
-    file_bytes = uploaded_file.getvalue()
-    base_filename = os.path.splitext(uploaded_file.name)[0]
-    download_filename = f"{base_filename}_매니저업적_환산결과.xlsx"
+    digests = [file_digest(f.getvalue()) for f in uploaded_files]
+    base_filename = os.path.splitext(uploaded_files[0].name)[0]
+    if len(uploaded_files) > 1:
+        base_filename += f" 외 {len(uploaded_files) - 1}개"
+    download_filename = f"{base_filename}{RESULT_SUFFIX}"
+
+    # 여러 파일: 파일 순서까지 포함한 해시(먼저 올린 파일의 계약이 남음)
+    file_hash = digests[0] if len(uploaded_files) == 1 else file_digest("|".join(digests).encode())
+    prof.context.update(file_hash=file_hash, files=len(uploaded_files))
+
+    job = upload_job(uploaded_files, file_hash, rules, incremental, perf_enabled)
+    if job.failed:
+        job_error(job, UPLOAD_JOB, len(uploaded_files) > 1)
+    if job.running:
+        job_progress(UPLOAD_JOB, len(job.finished))
+    if not job.has("load"):
+        return
+    raw, merge_stats = job.result("load")
 
-    raw = load_df_from_bytes(file_bytes)
+    # 필수 컬럼 체크
+    if missing_columns(raw):
+        st.error("❌ 업로드된 파일에 다음 항목이 모두 포함되어 있어야 합니다:\n" + ", ".join(sorted(REQUIRED_COLUMNS)))
+        st.stop()
 
-    df_valid, excluded_df = exclude_contracts(raw)
-    excluded_disp_all = build_excluded_with_reason(excluded_df)
+    if merge_stats is not None:
+        st.info(
+            f"📚 {len(merge_stats)}개 파일 합침: 총 {int(merge_stats['행수'].sum()):,}건 → "
+            f"중복 {int(merge_stats['중복'].sum()):,}건 제외, {len(raw):,}건 반영"
+        )
+        with st.expander("📚 파일별 반영 현황"):
+            st.dataframe(merge_stats, use_container_width=True)
 
-    # 필수 컬럼 체크(유효 df 기준)
-    df_valid.rename(columns={"계약일": "계약일자", "초회보험료": "보험료"}, inplace=True)
-    required_columns = {"수금자명", "계약일자", "보험사", "상품명", "납입기간", "보험료", "쉐어율"}
-    if not required_columns.issubset(df_valid.columns):
-        st.error("❌ 업로드된 파일에 다음 항목이 모두 포함되어 있어야 합니다:\n" + ", ".join(sorted(required_columns)))
-        st.stop()
-    if df_valid["쉐어율"].isnull().any():
+    if not job.has("score"):
+        return
+    state, changes, reused = job.result("score")
+    # 작업 결과는 화면 스레드에서 세션에 반영(다음 업로드의 증분 비교 기준)
+    if st.session_state.get("score_state") is not state:
+        st.session_state["score_state"] = state
+        if not reused:
+            st.session_state["score_changes"] = changes
+
+    df_all, excluded_df = state.scored, state.excluded
+    if df_all["쉐어율"].isnull().any():
         st.error("❌ '쉐어율'에 빈 값이 포함되어 있습니다. 모든 행에 값을 입력해주세요.")
         st.stop()
 
-    df_all = compute_manager_score(df_valid)
-
     # 날짜 경고
-    invalid_dates = df_all[df_all["계약일자_raw"].isna()]
+    invalid_dates = df_all[df_all["계약일자"].isna()]
     if not invalid_dates.empty:
         st.warning(f"⚠️ {len(invalid_dates)}건의 계약일자가 날짜로 인식되지 않았습니다. 엑셀에서 '2025-07-23'처럼 입력해주세요.")
 
     # 제외 건 표시
     if not excluded_df.empty:
-        st.warning(f"⚠️ 제외된 계약 {len(excluded_df)}건 (일시납 / 연금성·저축성 / 철회·해약·실효)")
+        st.warning(f"⚠️ 제외된 계약 {len(excluded_df)}건 ({' / '.join(rules.exclusion_labels)})")
         with st.expander("🚫 제외된 계약 목록 보기"):
             excluded_display = excluded_df[
                 ["수금자명","계약일","보험사","상품명","납입기간","초회보험료","납입방법","계약상태","상품군2"]
@@ -412,8 +505,26 @@ def run():
             excluded_display.rename(columns={"초회보험료":"보험료"}, inplace=True)
             st.dataframe(excluded_display, use_container_width=True)
 
-    # ✅ 여러 명 선택
-    all_collectors = sorted(df_all["수금자명"].astype(str).unique().tolist())
+    # 직전 업로드 대비 변경 내역
+    changes = st.session_state.get("score_changes")
+    if changes:
+        counts = changes["counts"]
+        st.info(
+            "🔄 직전 업로드 대비 "
+            + " · ".join(f"{k} {v:,}건" for k, v in counts.items())
+            + f" (다시 계산 {changes['rescored']:,}건)"
+        )
+        with st.expander("🔄 변경 내역 보기"):
+            st.markdown("#### 👥 수금자별 변동")
+            moved = changes["collectors"].copy()
+            for c in ["환산금액합계", "환산금액증감"]:
+                moved[c] = moved[c].map(format_money)
+            st.dataframe(moved, use_container_width=True)
+            st.markdown("#### 📄 변경된 계약")
+            st.dataframe(changes["contracts"], use_container_width=True)
+
+    # ✅ 여러 명 선택(수금자 목록은 수금자별 합계 색인에서 — 계약 행 분할을 기다리지 않음)
+    all_collectors = collector_keys(state.agg.index).tolist()
     col1, col2 = st.columns([1, 2])
     with col1:
         use_all = st.checkbox("전체 선택", value=True)
@@ -429,15 +540,9 @@ def run():
         st.warning("선택된 수금자가 없습니다. 1명 이상 선택해주세요.")
         return
 
-    # 선택된 수금자만 필터
-    show_df = df_all[df_all["수금자명"].astype(str).isin(selected_collectors)].copy()
-
-    # 메인 표
-    st.subheader("📄 선택된 수금자 합산 기준 환산 결과")
-    st.dataframe(to_styled(show_df), use_container_width=True)
-
-    # 총합
-    perf_sum, score_sum = sums(show_df)
+    # 총합(선택된 수금자만, 수금자별 합계 색인으로)
+    selected_agg = select_collectors(state.agg, selected_collectors)
+    perf_sum, score_sum = sums(selected_agg)
     st.subheader("📈 총합")
     st.markdown(
         f"""
@@ -451,10 +556,17 @@ def run():
         unsafe_allow_html=True,
     )
 
-    # ✅ 수금자별 요약 + TOP3
+    if not job.has("rank"):
+        return
+    # ✅ 수금자별 요약 + TOP3(전체 선택이면 작업에서 만든 순위 그대로)
     st.subheader("🧮 수금자별 요약")
-    group = make_group_with_ranks(show_df)
-    top_amt, top_cnt = top3_tables(group)
+    if len(selected_agg) == len(state.agg):
+        group, top_amt, top_cnt = job.result("rank")
+    else:
+        with prof.stage("rank_collectors", len(selected_agg)) as rec:
+            group = rank_collectors(selected_agg)
+            top_amt, top_cnt = top3_tables(group)
+            rec["rows_out"] = len(group)
 
     st.markdown("#### 🏅 환산금액합계 TOP3(동률 포함)")
     top_amt_disp = top_amt.copy()
@@ -472,18 +584,85 @@ def run():
     disp_group = disp_group.sort_values(["환산금액합계", "건수", "수금자명"], ascending=[False, False, True])
     st.dataframe(disp_group, use_container_width=True)
 
-    # 엑셀 생성/다운로드 (선택된 수금자 기준)
-    wb = build_workbook(show_df, group, excluded_disp_all, top_amt, top_cnt)
-    excel_output = BytesIO()
-    wb.save(excel_output)
-    excel_output.seek(0)
-
-    st.download_button(
-        label="📥 환산 결과 엑셀 다운로드 (TOP3 + 요약 + 수금자별 시트 + 제외사유)",
-        data=excel_output,
-        file_name=download_filename,
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    if not job.has("index"):
+        return
+    # 선택된 수금자 계약 행: 작업에서 미리 나눈 위치로
+    with prof.stage("select_collectors", len(df_all)) as rec:
+        show_df = collector_rows(state, selected_collectors)
+        rec["rows_out"] = len(show_df)
+
+    # 메인 표(필터/정렬/페이지 나눔은 서버에서, 표시용 문자열은 보이는 페이지만)
+    st.subheader("📄 선택된 수금자 합산 기준 환산 결과")
+    g1, g2, g3 = st.columns([1, 2, 2])
+    with g1:
+        grid_collector = st.selectbox("수금자", ["전체", *selected_collectors], key="grid_collector")
+    with g2:
+        insurer_options = sorted(show_df["보험사"].dropna().astype(str).unique().tolist())
+        grid_insurers = st.multiselect("보험사", insurer_options, key="grid_insurers")
+    with g3:
+        dates = show_df["계약일자"]
+        date_bounds = (dates.min().date(), dates.max().date()) if dates.notna().any() else None
+        grid_dates = None
+        if date_bounds is not None:
+            picked = st.date_input("계약일자", value=date_bounds, min_value=date_bounds[0],
+                                   max_value=date_bounds[1], key="grid_dates")
+            # 전체 기간 그대로면 필터 안 함(날짜 인식 안 된 계약도 표시)
+            if len(picked) == 2 and tuple(picked) != date_bounds:
+                grid_dates = tuple(picked)
+    g4, g5, g6 = st.columns([2, 1, 1])
+    with g4:
+        grid_sort = st.selectbox("정렬", list(GRID_SORTS), key="grid_sort")
+    with g5:
+        grid_desc = st.checkbox("내림차순", key="grid_desc")
+    with g6:
+        page_size = st.selectbox("페이지당 행 수", GRID_PAGE_SIZES, key="grid_page_size")
+
+    with prof.stage("grid_rows", len(show_df)) as rec:
+        rows = grid_rows(
+            show_df,
+            collector=None if grid_collector == "전체" else grid_collector,
+            insurers=grid_insurers,
+            date_range=grid_dates,
+            sort_by=GRID_SORTS[grid_sort],
+            ascending=not grid_desc,
+        )
+        rec["rows_out"] = len(rows)
+    pages = max(1, -(-len(rows) // page_size))
+    # 필터/정렬이 바뀌면 1페이지부터
+    page_key = f"grid_page_{hash((grid_collector, tuple(grid_insurers), grid_dates, grid_sort, grid_desc, page_size))}"
+    page = st.number_input(f"페이지 (총 {pages:,}쪽)", min_value=1, max_value=pages, value=1, key=page_key)
+    with prof.stage("grid_page", len(rows)) as rec:
+        page_df = grid_page(show_df, rows, int(page), page_size)
+        rec["rows_out"] = len(page_df)
+    st.dataframe(page_df, use_container_width=True)
+    first = (int(page) - 1) * page_size
+    st.caption(f"총 {len(rows):,}건 중 {min(first + 1, len(rows)):,}–{min(first + page_size, len(rows)):,}건 표시")
+
+    trend_section(state, selected_collectors, prof)
+
+    # 엑셀 생성/다운로드 (선택된 수금자 기준, 버튼을 눌렀을 때만 백그라운드로 생성)
+    key = export_key(file_hash, selected_collectors, rules.fingerprint)
+    if st.button("🛠️ 환산 결과 엑셀 만들기"):
+        st.session_state["export_key"] = key
+
+    if st.session_state.get("export_key") == key:
+        xjob = export_job(key, show_df, group, excluded_df, top_amt, top_cnt, perf_enabled)
+        if xjob.failed:
+            # 다시 만들려면 버튼을 다시 누름
+            st.session_state.pop("export_key", None)
+            job_error(xjob, EXPORT_JOB)
+        if xjob.running:
+            job_progress(EXPORT_JOB, len(xjob.finished))
+        if xjob.done:
+            st.download_button(
+                label="📥 환산 결과 엑셀 다운로드 (TOP3 + 요약 + 수금자별 시트 + 제외사유)",
+                data=xjob.result("export"),
+                file_name=download_filename,
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+    else:
+        # 선택이 바뀌어 이전 엑셀이 쓸모없어짐
+        cancel_jobs(EXPORT_JOB)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+"""
+일괄 처리(Streamlit 비의존) — 야간 작업/지점별 보고서
+- 폴더 안의 계약 목록(.xlsx)마다 환산 결과 엑셀 1개 + 통합 요약(통합_요약.xlsx) 1개
+- 파일 단위로 프로세스 풀에서 동시에 처리(파일 하나 안에서는 순차 렌더링)
+- 화면(app.py)과 같은 읽기/환산/엑셀 단계 사용, streamlit 을 import 하지 않음
+- 사용: python batch.py <입력 폴더> [-o 출력 폴더] [-w 작업 수] [--rules 규칙 파일]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from excel_export import RESULT_SUFFIX, build_summary_workbook, build_workbook
+from ingest import COLUMNS_NEEDED, load_contracts
+from pipeline import (
+    aggregate_by_collector, build_excluded_with_reason, make_group_with_ranks, missing_columns,
+    rank_collectors, score_contracts, top3_tables,
+)
+from rules import RULES_PATH, load_rules
+
+
+# ── 상수 ────────────────────────────────────────────────────
+SUMMARY_FILENAME = "통합_요약.xlsx"
+
+# 동시에 처리할 파일 수(1이면 순차)
+BATCH_WORKERS = min(4, os.cpu_count() or 1)
+
+STATUS_OK = "완료"
+
+
+# ── 파일 1개 ────────────────────────────────────────────────
+def input_files(input_dir: str) -> list:
+    """입력 폴더의 .xlsx(엑셀 임시 파일 '~$', 이전 결과/요약 파일 제외, 이름 순)"""
+    names = [
+        n for n in os.listdir(input_dir)
+        if n.lower().endswith(".xlsx") and not n.startswith("~$")
+        and not n.endswith(RESULT_SUFFIX) and n != SUMMARY_FILENAME
+    ]
+    return [os.path.join(input_dir, n) for n in sorted(names)]
+
+
+def process_file(path: str, output_dir: str, rules_path: str = RULES_PATH):
+    """
+    (프로세스 풀 작업) 계약 목록 1개 → 결과 엑셀 저장
+    - 반환: (파일별 합계 dict, 수금자별 합계[인덱스 = 수금자명] 또는 None)
+    - 읽기/컬럼 오류는 예외 대신 상태에 기록(다른 파일 처리는 계속)
+    """
+    name = os.path.basename(path)
+    row = {"파일": name, "상태": STATUS_OK, "계약건수": 0, "제외건수": 0, "수금자수": 0,
+           "실적보험료합계": 0.0, "환산금액합계": 0.0, "결과파일": ""}
+    try:
+        rules = load_rules(rules_path)
+        with open(path, "rb") as f:
+            raw = load_contracts(f.read(), COLUMNS_NEEDED)
+        missing = missing_columns(raw)
+        if missing:
+            row["상태"] = "필수 컬럼 없음: " + ", ".join(missing)
+            return row, None
+
+        df, excluded = score_contracts(raw, rules)
+        group = make_group_with_ranks(df)
+        top_amt, top_cnt = top3_tables(group)
+        data = build_workbook(df, group, build_excluded_with_reason(excluded), top_amt, top_cnt)
+    except (OSError, ValueError, KeyError, TypeError, zipfile.BadZipFile) as err:
+        row["상태"] = f"실패: {err}"
+        return row, None
+
+    result_name = os.path.splitext(name)[0] + RESULT_SUFFIX
+    tmp = os.path.join(output_dir, f".{result_name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, os.path.join(output_dir, result_name))
+
+    row.update(
+        계약건수=len(raw),
+        제외건수=len(excluded),
+        수금자수=len(group),
+        실적보험료합계=float(df["실적보험료"].sum()),
+        환산금액합계=float(df["환산금액"].sum()),
+        결과파일=result_name,
+    )
+    return row, aggregate_by_collector(df)
+
+
+# ── 폴더 전체 ───────────────────────────────────────────────
+def run_batch(input_dir: str, output_dir: str = None, workers: int = BATCH_WORKERS,
+              rules_path: str = RULES_PATH) -> pd.DataFrame:
+    """
+    ✅ 폴더 일괄 처리 → 파일별 합계 DataFrame
+    - 결과 파일은 입력 순서와 관계없이 같은 내용(파일별 독립 처리)
+    - 통합 요약: 파일별 합계 + 전체 파일 합산 수금자 순위
+    """
+    load_rules(rules_path)  # 규칙 파일 오류는 파일 처리 전에 바로 알림
+    output_dir = output_dir or input_dir
+    os.makedirs(output_dir, exist_ok=True)
+    paths = input_files(input_dir)
+    args = [(p, output_dir, os.path.abspath(rules_path)) for p in paths]
+
+    if workers > 1 and len(paths) > 1:
+        # spawn: 작업 프로세스마다 깨끗한 인터프리터(스레드/fork 혼용 방지)
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=mp.get_context("spawn")) as pool:
+            results = list(pool.map(process_file, *zip(*args)))
+    else:
+        results = [process_file(*a) for a in args]
+
+    files = pd.DataFrame([row for row, _ in results],
+                         columns=["파일", "상태", "계약건수", "제외건수", "수금자수",
+                                  "실적보험료합계", "환산금액합계", "결과파일"])
+    aggs = [agg for _, agg in results if agg is not None and not agg.empty]
+    if aggs:
+        ranking = rank_collectors(pd.concat(aggs).groupby(level=0, dropna=False).sum())
+    else:
+        ranking = pd.DataFrame()
+
+    with open(os.path.join(output_dir, SUMMARY_FILENAME), "wb") as f:
+        f.write(build_summary_workbook(files, ranking))
+    return files
+
+
+# ── 진입점 ──────────────────────────────────────────────────
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="계약 목록 폴더 일괄 환산(파일별 결과 엑셀 + 통합 요약)")
+    parser.add_argument("input_dir", help="계약 목록(.xlsx) 폴더")
+    parser.add_argument("-o", "--output-dir", help="결과 폴더(기본: 입력 폴더)")
+    parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS, help="동시에 처리할 파일 수")
+    parser.add_argument("--rules", default=RULES_PATH, help="환산 규칙 파일(rules.json)")
+    args = parser.parse_args(argv)
+
+    files = run_batch(args.input_dir, args.output_dir, args.workers, args.rules)
+    for row in files.itertuples(index=False):
+        print(f"{row.파일}\t{row.상태}\t{row.계약건수}건\t{row.환산금액합계:,.0f} 원")
+    print(f"→ {os.path.join(args.output_dir or args.input_dir, SUMMARY_FILENAME)}")
+    return 0 if (files["상태"] == STATUS_OK).all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+단계별 성능 측정(Streamlit 비의존)
+- 합성 계약 목록(보유계약 장기 내보내기와 같은 컬럼) 생성 → 읽기/제외/점수/요약/엑셀 단계별 시간·최대 메모리
+- 기준값(bench_baseline.json)과 비교해 느려지거나 메모리가 늘어난 단계를 표시(종료 코드 1)
+- 사용:
+    python bench.py                          # 1천/1만/10만/100만 행 측정 + 기준값 비교
+    python bench.py --sizes 1000,10000 --save  # 측정 결과를 기준값으로 저장
+    python bench.py --collectors 50 --exclusion-ratio 0.3 --nonlife-ratio 0.6
+- 기준값은 측정한 컴퓨터 기준이므로 같은 환경에서 저장/비교
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from excel_export import build_workbook
+from ingest import COLUMNS_NEEDED, load_contracts
+from instrument import PeakMemory
+from pipeline import (
+    build_excluded_with_reason, compute_manager_score, exclude_contracts, make_group_with_ranks, top3_tables,
+)
+from rules import load_rules
+
+
+# ── 상수 ────────────────────────────────────────────────────
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+BASELINE_PATH = os.environ.get(
+    "BENCH_BASELINE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json"),
+)
+
+# 기준값 대비 이 비율 넘게 늘면 회귀(작은 값의 흔들림은 최소 차이로 거름)
+TOLERANCE = 0.25
+MIN_SECONDS_DELTA = 0.05
+MIN_MB_DELTA = 5.0
+
+LIFE_INSURERS = ["한화생명", "삼성생명", "교보생명", "신한라이프", "동양생명"]
+NONLIFE_INSURERS = ["DB손해보험", "현대해상", "KB손보", "메리츠화재", "삼성화재"]
+PRODUCTS = ["건강보험", "종신보험", "암보험", "어린이보험", "운전자보험", "실손보험"]
+TERMS = [5, 7, 10, 12, 15, 20, 30]
+SHARE_RATES = ["100%", "100%", "100%", "50%", "70%"]
+
+# 제외 사유별 (컬럼, 값) — 제외 대상 행에 하나씩 고르게 배정
+EXCLUSION_VALUES = [
+    ("납입방법", "일시납"),
+    ("상품군2", "연금성"),
+    ("상품군2", "저축성"),
+    ("계약상태", "철회"),
+    ("계약상태", "해약"),
+    ("계약상태", "실효"),
+]
+
+
+# ── 합성 데이터 ─────────────────────────────────────────────
+def default_insurer_mix(nonlife_ratio: float = 0.4) -> dict:
+    """보험사 → 비중(손해보험사 합계 = nonlife_ratio)"""
+    mix = {name: (1 - nonlife_ratio) / len(LIFE_INSURERS) for name in LIFE_INSURERS}
+    mix.update({name: nonlife_ratio / len(NONLIFE_INSURERS) for name in NONLIFE_INSURERS})
+    return mix
+
+
+def generate_contracts(rows: int, collectors: int = 30, exclusion_ratio: float = 0.2,
+                       insurer_mix: dict = None, seed: int = 0) -> pd.DataFrame:
+    """
+    ✅ 합성 계약 목록(COLUMNS_NEEDED 컬럼, 원본 내보내기 이름)
+    - exclusion_ratio: 제외 조건(일시납/연금·저축성/철회·해약·실효) 중 하나에 걸리는 행 비율
+    - insurer_mix: {보험사명: 비중} (기본: 손해보험 40%)
+    """
+    rng = np.random.default_rng(seed)
+    mix = insurer_mix or default_insurer_mix()
+    weights = np.array(list(mix.values()), dtype=np.float64)
+
+    df = pd.DataFrame({
+        "수금자명": np.array([f"수금자{i:04d}" for i in range(collectors)])[rng.integers(0, collectors, rows)],
+        "계약일": pd.Timestamp("2025-07-01") + pd.to_timedelta(rng.integers(0, 62, rows), unit="D"),
+        "보험사": np.array(list(mix))[rng.choice(len(mix), rows, p=weights / weights.sum())],
+        "상품명": np.array(PRODUCTS)[rng.integers(0, len(PRODUCTS), rows)],
+        "납입기간": np.array(TERMS)[rng.integers(0, len(TERMS), rows)],
+        "초회보험료": rng.integers(1, 300, rows) * 1000,
+        "쉐어율": np.array(SHARE_RATES)[rng.integers(0, len(SHARE_RATES), rows)],
+        "납입방법": "월납",
+        "상품군2": "보장성",
+        "계약상태": "정상",
+    })
+
+    excluded = np.flatnonzero(rng.random(rows) < exclusion_ratio)
+    reasons = rng.integers(0, len(EXCLUSION_VALUES), len(excluded))
+    for i, (column, value) in enumerate(EXCLUSION_VALUES):
+        df.loc[excluded[reasons == i], column] = value
+    return df[COLUMNS_NEEDED]
+
+
+def to_xlsx_bytes(df: pd.DataFrame) -> bytes:
+    """합성 계약 목록 → xlsx(write-only, 날짜는 날짜 서식 셀)"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(df.columns))
+    dates = df["계약일"].dt.to_pydatetime()
+    j = df.columns.get_loc("계약일")
+    for i, row in enumerate(df.itertuples(index=False, name=None)):
+        row = list(row)
+        row[j] = dates[i]
+        ws.append(row)
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+# ── 측정 ────────────────────────────────────────────────────
+def measure(fn, *args, **kwargs):
+    """fn 1회 실행 → (반환값, 초, 최대 메모리 증가 MB)"""
+    with PeakMemory() as mem:
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        seconds = time.perf_counter() - t0
+    return out, seconds, mem.peak_mb
+
+
+def run_stages(file_bytes: bytes, rules, workers: int = 1) -> list:
+    """
+    계약 목록 1개에 대해 화면/일괄 처리와 같은 순서로 단계별 측정
+    → [(단계, 초, MB), ...]
+    """
+    results = []
+
+    def step(name, fn, *args, **kwargs):
+        out, seconds, mb = measure(fn, *args, **kwargs)
+        results.append((name, seconds, mb))
+        return out
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        raw = step("load", load_contracts, file_bytes, COLUMNS_NEEDED, cache_dir)
+        step("load_cached", load_contracts, file_bytes, COLUMNS_NEEDED, cache_dir)
+    valid, excluded = step("exclude_contracts", exclude_contracts, raw, rules)
+    excluded_disp = step("build_excluded_with_reason", build_excluded_with_reason, excluded)
+    scored = step("compute_manager_score", compute_manager_score, valid, rules)
+    group = step("make_group_with_ranks", make_group_with_ranks, scored)
+    top_amt, top_cnt = top3_tables(group)
+    step("build_workbook", build_workbook, scored, group, excluded_disp, top_amt, top_cnt, workers=workers)
+    return results
+
+
+# ── 기준값 ──────────────────────────────────────────────────
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("stages", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(report: pd.DataFrame, path: str = BASELINE_PATH):
+    """측정 결과를 기준값으로 저장(같은 행 수·단계만 덮어씀)"""
+    stages = load_baseline(path)
+    for row in report.itertuples(index=False):
+        stages[f"{row.rows}:{row.stage}"] = {"seconds": round(row.seconds, 4), "peak_mb": round(row.peak_mb, 1)}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"python": sys.version.split()[0], "pandas": pd.__version__, "stages": stages},
+                  f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def compare(report: pd.DataFrame, baseline: dict, tolerance: float = TOLERANCE) -> pd.DataFrame:
+    """기준값 컬럼 + 회귀 표시(시간/메모리 각각 허용 비율·최소 차이 모두 넘을 때)"""
+    base = [baseline.get(f"{r}:{s}", {}) for r, s in zip(report["rows"], report["stage"])]
+    report = report.assign(
+        base_seconds=[b.get("seconds", np.nan) for b in base],
+        base_mb=[b.get("peak_mb", np.nan) for b in base],
+    )
+    slow = (report["seconds"] > report["base_seconds"] * (1 + tolerance)) & \
+           (report["seconds"] - report["base_seconds"] > MIN_SECONDS_DELTA)
+    heavy = (report["peak_mb"] > report["base_mb"] * (1 + tolerance)) & \
+            (report["peak_mb"] - report["base_mb"] > MIN_MB_DELTA)
+    report["regression"] = np.select([slow & heavy, slow, heavy], ["시간+메모리", "시간", "메모리"], "")
+    return report
+
+
+# ── 진입점 ──────────────────────────────────────────────────
+def run_benchmark(sizes=SIZES, collectors: int = 30, exclusion_ratio: float = 0.2,
+                  nonlife_ratio: float = 0.4, workers: int = 1, seed: int = 0, log=print) -> pd.DataFrame:
+    """✅ 행 수별 합성 파일 생성 → 단계별 측정 → DataFrame(rows, stage, seconds, peak_mb)"""
+    rules = load_rules()
+    rows = []
+    for n in sizes:
+        t0 = time.perf_counter()
+        df = generate_contracts(n, collectors, exclusion_ratio, default_insurer_mix(nonlife_ratio), seed)
+        file_bytes = to_xlsx_bytes(df)
+        del df
+        log(f"[{n:,}행] 합성 파일 {len(file_bytes) / 2**20:,.1f} MB ({time.perf_counter() - t0:.1f}초)")
+        for stage, seconds, mb in run_stages(file_bytes, rules, workers):
+            rows.append({"rows": n, "stage": stage, "seconds": seconds, "peak_mb": mb})
+    return pd.DataFrame(rows, columns=["rows", "stage", "seconds", "peak_mb"])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="단계별 성능 측정 + 기준값 비교")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in SIZES), help="행 수 목록(쉼표 구분)")
+    parser.add_argument("--collectors", type=int, default=30, help="수금자 수")
+    parser.add_argument("--exclusion-ratio", type=float, default=0.2, help="제외 대상 행 비율(0~1)")
+    parser.add_argument("--nonlife-ratio", type=float, default=0.4, help="손해보험사 계약 비율(0~1)")
+    parser.add_argument("--workers", type=int, default=1, help="엑셀 병렬 렌더링 프로세스 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="기준값 파일")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="회귀로 볼 증가 비율")
+    parser.add_argument("--save", action="store_true", help="이번 결과를 기준값으로 저장")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run_benchmark(sizes, args.collectors, args.exclusion_ratio, args.nonlife_ratio,
+                           args.workers, args.seed)
+    report = compare(report, load_baseline(args.baseline), args.tolerance)
+
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(report.to_string(index=False, float_format=lambda x: f"{x:,.3f}"))
+
+    if args.save:
+        save_baseline(report, args.baseline)
+        print(f"→ 기준값 저장: {args.baseline}")
+        return 0
+    regressions = report[report["regression"] != ""]
+    if not regressions.empty:
+        print(f"⚠️ 회귀 {len(regressions)}건: " + ", ".join(f"{r.rows:,}행 {r.stage}({r.regression})"
+                                                        for r in regressions.itertuples(index=False)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,440 @@
+"""
+엑셀 출력 단계(Streamlit 비의존)
+- 요약 시트 + 수금자별 시트를 write-only 통합문서로 스트리밍
+- 수금자 시트는 프로세스 풀에서 병렬 렌더링 후 정해진 순서로 합침
+- 저장 결과는 실행마다 바이트 단위로 동일(감사용 diff 유지)
+"""
+import re
+import warnings
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import multiprocessing as mp
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, Border, Side, PatternFill, NamedStyle
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.worksheet.table import Table, TableStyleInfo, TableColumn
+
+from instrument import stage
+from jobs import JobCancelled, check_cancelled
+from pipeline import collector_keys
+
+
+# ── 상수 ────────────────────────────────────────────────────
+# 엑셀 공용 서식(이름 있는 스타일, 통합문서당 1회 등록)
+STYLE_CELL = "환산_표"
+STYLE_TITLE = "환산_제목"
+STYLE_TOTAL_LABEL = "환산_합계라벨"
+STYLE_TOTAL_VALUE = "환산_합계값"
+STYLE_ORDER = (STYLE_CELL, STYLE_TITLE, STYLE_TOTAL_LABEL, STYLE_TOTAL_VALUE)
+
+# 병렬 렌더링: 수금자 시트가 이 수 이상일 때만 프로세스 풀 사용(풀 기동 비용 > 이득 방지)
+PARALLEL_MIN_SHEETS = 40
+
+# 취소 확인 간격(행) — 긴 표도 이 행 수마다 취소 여부 확인
+CANCEL_CHECK_ROWS = 2_000
+
+# 결과 파일 이름: <원본 파일명><RESULT_SUFFIX>
+RESULT_SUFFIX = "_매니저업적_환산결과.xlsx"
+
+# 결과 파일 고정 시각(zip 항목 + 문서 속성) → 실행마다 같은 바이트
+STABLE_ZIP_TIME = (1980, 1, 1, 0, 0, 0)
+STABLE_DOC_TIME = "1980-01-01T00:00:00Z"
+
+
+# ── 유틸 ────────────────────────────────────────────────────
+def unique_sheet_name(wb, base, limit=31):
+    name = str(base)[:limit] if base else "Sheet"
+    if name not in wb.sheetnames:
+        return name
+    i = 2
+    while True:
+        suffix = f"_{i}"
+        trunc = limit - len(suffix)
+        cand = f"{name[:trunc]}{suffix}"
+        if cand not in wb.sheetnames:
+            return cand
+        i += 1
+
+
+def safe_table_name(base: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_]", "_", base)
+    if not re.match(r"^[A-Za-z_]", name):
+        name = f"tbl_{name}"
+    return name[:254]
+
+
+def col_idx(df: pd.DataFrame, name, default=None):
+    """df 컬럼 위치(1부터) — write-only 시트는 셀을 다시 읽을 수 없으므로 df 기준"""
+    cols = list(df.columns)
+    return cols.index(name) + 1 if name in cols else default
+
+
+def format_money(x):
+    try:
+        return f"{float(x):,.0f} 원"
+    except Exception:
+        return ""
+
+
+def column_widths(df: pd.DataFrame, padding=5, max_width=45) -> dict:
+    """
+    ✅ 전체 셀 스캔 대신:
+    - 헤더 + 상위 30행 샘플 기반 자동 너비 계산(빠름)
+    - {열 번호: 너비} 반환 → 행 쓰기 전에 시트에 적용
+    """
+    if df is None:
+        return {}
+    if df.empty:
+        return {j: min(max(len(str(col)) + padding, 10), max_width) for j, col in enumerate(df.columns, 1)}
+
+    # 빈 값은 'nan' 길이로 셈(str dtype 의 astype(str) 은 빈 값을 그대로 둠)
+    sample = df.head(30).astype(str).fillna("nan")
+    widths = {}
+    for j, col in enumerate(df.columns, 1):
+        header_len = len(str(col))
+        sample_max = sample[col].map(len).max() if col in sample.columns else 0
+        widths[j] = min(max(header_len, sample_max) + padding, max_width)
+    return widths
+
+
+def apply_column_widths(ws, widths: dict):
+    for j, width in widths.items():
+        ws.column_dimensions[get_column_letter(j)].width = width
+
+
+# ── 화면/엑셀 표 가공 ────────────────────────────────────────
+def to_styled(df: pd.DataFrame) -> pd.DataFrame:
+    _ = df.copy()
+    _["계약일자"] = _["계약일자"].dt.strftime("%Y-%m-%d")
+    _["납입기간"] = _["납입기간"].astype(str) + "년"
+    # 점수표에는 원본 보험료 대신 같은 값인 실적보험료만 보관
+    _["보험료"] = _["실적보험료"].map("{:,.0f} 원".format)
+    _["쉐어율"] = _["쉐어율"].astype(str) + " %"
+    _["실적보험료"] = _["실적보험료"].map("{:,.0f} 원".format)
+    _["환산율"] = _["환산율"].astype(str) + " %"
+    _["환산금액"] = _["환산금액"].map("{:,.0f} 원".format)
+
+    return _[
+        ["수금자명","계약일자","보험사","보험구분","상품명",
+         "납입기간","보험료","쉐어율","실적보험료","환산율","환산금액"]
+    ]
+
+
+def partition_by_collector(df: pd.DataFrame) -> dict:
+    """
+    수금자명(문자열) → 행 위치 배열
+    - 수금자마다 전체를 다시 훑는 마스크 대신 groupby 한 번으로 분할
+    """
+    if df is None or df.empty:
+        return {}
+    return df.groupby(collector_keys(df["수금자명"]), sort=True).indices
+
+
+def sums_by_collector(df: pd.DataFrame) -> pd.DataFrame:
+    """수금자별 (실적보험료, 환산금액) 합계를 한 번에 계산"""
+    return df.groupby(collector_keys(df["수금자명"]))[["실적보험료", "환산금액"]].sum()
+
+
+# ── 시트 쓰기 ────────────────────────────────────────────────
+def register_named_styles(wb):
+    """
+    셀마다 서식 객체를 만들지 않고 이름 있는 스타일을 공유
+    - 셀 서식 번호를 등록 순서(STYLE_ORDER)로 고정 → 다른 프로세스에서 만든 시트 XML도 그대로 합칠 수 있음
+    - 서식 번호는 openpyxl 내부 목록에 직접 등록하므로 번호가 1..N 으로 나오는지 확인
+      (버전이 바뀌어 달라지면 결과 바이트가 어긋나므로 바로 실패, requirements.txt 에 버전 고정)
+    """
+    thin = Side(style="thin")
+    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    fill = PatternFill("solid", fgColor="F2F2F2")
+
+    wb.add_named_style(NamedStyle(name=STYLE_CELL, font=DEFAULT_FONT, border=DEFAULT_BORDER,
+                                  alignment=Alignment(horizontal="center", vertical="center")))
+    wb.add_named_style(NamedStyle(name=STYLE_TITLE, font=Font(bold=True), border=DEFAULT_BORDER))
+    wb.add_named_style(NamedStyle(name=STYLE_TOTAL_LABEL, font=DEFAULT_FONT, alignment=Alignment(horizontal="center"),
+                                  fill=fill, border=thin_border))
+    wb.add_named_style(NamedStyle(name=STYLE_TOTAL_VALUE, font=Font(bold=True), alignment=Alignment(horizontal="center"),
+                                  fill=fill, border=thin_border))
+
+    ids = [wb._cell_styles.add(wb._named_styles[name].as_tuple()) for name in STYLE_ORDER]
+    if ids != list(range(1, len(STYLE_ORDER) + 1)):
+        raise RuntimeError(f"셀 서식 번호가 예상과 다릅니다({ids}) — openpyxl 버전을 확인하세요")
+
+
+class SheetStream:
+    """
+    write-only 시트에 위에서 아래로 행을 흘려보내는 도우미
+    - 현재까지 쓴 행 번호를 기억하고, 건너뛴 행은 빈 행으로 채움
+    - 열 너비는 행을 쓰기 전에 적용해야 함(write-only 제약)
+    - rows=False: 표/너비 정의만 남기고 셀은 쓰지 않음(병렬 렌더링 뼈대용)
+    - cancel(threading.Event): CANCEL_CHECK_ROWS 행마다 취소 확인
+    """
+
+    def __init__(self, ws, sheet_no: int, rows: bool = True, cancel=None):
+        self.ws = ws
+        self.sheet_no = sheet_no
+        self.rows = rows
+        self.cancel = cancel
+        self.row = 0
+
+    def styled(self, value, style):
+        cell = WriteOnlyCell(self.ws, value=value)
+        cell.style = style
+        return cell
+
+    def append(self, row: int, values):
+        if not self.rows:
+            return
+        while self.row < row - 1:
+            self.ws.append([])
+            self.row += 1
+        self.ws.append(values)
+        self.row = row
+        if row % CANCEL_CHECK_ROWS == 0:
+            check_cancelled(self.cancel)
+
+    def title(self, row: int, text: str):
+        self.append(row, [self.styled(text, STYLE_TITLE)])
+
+
+def write_table(out: SheetStream, df_for_sheet: pd.DataFrame, start_row: int = 1, name_suffix: str = "A"):
+    if out.rows:
+        for r_idx, row in enumerate(dataframe_to_rows(df_for_sheet, index=False, header=True), start_row):
+            out.append(r_idx, [out.styled(value, STYLE_CELL) for value in row])
+
+    end_col_letter = get_column_letter(df_for_sheet.shape[1])
+    last_row = start_row + df_for_sheet.shape[0]
+
+    # 시트 번호 + 용도로 이름 고정(전역 카운터 없이 통합문서 안에서 유일)
+    display_name = safe_table_name(f"tbl_{out.ws.title}_{name_suffix}_{out.sheet_no}")
+
+    table = Table(displayName=display_name, ref=f"A{start_row}:{end_col_letter}{last_row}")
+    table.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
+    # write-only 모드에서는 표 머리글을 셀에서 읽지 못하므로 직접 지정
+    table.tableColumns = [TableColumn(id=i, name=str(col)) for i, col in enumerate(df_for_sheet.columns, 1)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        out.ws.add_table(table)
+
+    return last_row
+
+
+def totals_block(out: SheetStream, df_for_sheet: pd.DataFrame, perf, score, start_row: int):
+    col_rate = col_idx(df_for_sheet, "환산율", 1)
+    col_perf = col_idx(df_for_sheet, "실적보험료", 2)
+    col_score = col_idx(df_for_sheet, "환산금액", 3)
+
+    row = start_row + 2
+    values = [None] * max(col_rate, col_perf, col_score)
+    values[col_rate - 1] = out.styled("총 합계", STYLE_TOTAL_LABEL)
+    values[col_perf - 1] = out.styled(f"{perf:,.0f} 원", STYLE_TOTAL_VALUE)
+    values[col_score - 1] = out.styled(f"{score:,.0f} 원", STYLE_TOTAL_VALUE)
+    out.append(row, values)
+
+    return row
+
+
+def render_collector_sheet(out: SheetStream, styled_sub: pd.DataFrame, ex_sub: pd.DataFrame, perf, score):
+    """수금자 시트 1장: 계약 표 → 총 합계 → 제외 계약"""
+    widths = column_widths(styled_sub, padding=5)
+    # 금액 컬럼 최소 너비
+    for header in ["실적보험료", "환산금액"]:
+        idx = col_idx(styled_sub, header)
+        if idx:
+            widths[idx] = max(widths[idx], 20)
+    if not ex_sub.empty:
+        widths.update(column_widths(ex_sub, padding=5))
+    apply_column_widths(out.ws, widths)
+
+    table_last_row = write_table(out, styled_sub, start_row=1, name_suffix="NORM")
+    next_row = totals_block(out, styled_sub, perf, score, start_row=table_last_row)
+
+    if not ex_sub.empty:
+        out.title(next_row + 2, "제외 계약")
+        write_table(out, ex_sub, start_row=next_row + 3, name_suffix="EXC")
+
+
+def render_sheet_chunk(jobs: list) -> list:
+    """
+    (프로세스 풀 작업) 수금자 시트 여러 장을 별도 통합문서에 렌더링 → 시트 XML 목록
+    jobs: [(sheet_no, title, styled_sub, ex_sub, perf, score), ...]
+    """
+    wb = Workbook(write_only=True)
+    register_named_styles(wb)
+    for sheet_no, title, styled_sub, ex_sub, perf, score in jobs:
+        ws = wb.create_sheet(title=title)
+        render_collector_sheet(SheetStream(ws, sheet_no), styled_sub, ex_sub, perf, score)
+
+    buf = BytesIO()
+    wb.save(buf)
+    with zipfile.ZipFile(buf) as zf:
+        return [zf.read(sheet_xml_path(i)) for i in range(1, len(jobs) + 1)]
+
+
+def sheet_xml_path(sheet_no: int) -> str:
+    """openpyxl 이 n번째 시트를 저장하는 zip 경로(병렬 렌더링 합치기 기준)"""
+    return f"xl/worksheets/sheet{sheet_no}.xml"
+
+
+def stable_xlsx_bytes(data: bytes, replace: dict = None) -> bytes:
+    """
+    저장된 xlsx를 다시 묶어 실행 시각에 따라 바뀌는 부분을 고정
+    - zip 항목 시각, docProps/core.xml 작성/수정 시각
+    - replace: {zip 경로: 바이트} → 해당 항목 교체(병렬 렌더링 시트 합치기)
+      교체할 경로가 저장본에 없으면(openpyxl 시트 경로 규칙이 바뀜) 실패
+    """
+    replace = replace or {}
+    out = BytesIO()
+    with zipfile.ZipFile(BytesIO(data)) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        unknown = set(replace) - set(src.namelist())
+        if unknown:
+            raise RuntimeError(f"합칠 시트가 저장본에 없습니다({sorted(unknown)[:3]}) — openpyxl 버전을 확인하세요")
+        for info in src.infolist():
+            body = replace.get(info.filename)
+            if body is None:
+                body = src.read(info.filename)
+            if info.filename == "docProps/core.xml":
+                body = re.sub(rb"(<dcterms:(created|modified)[^>]*>)[^<]*", rb"\g<1>" + STABLE_DOC_TIME.encode(), body)
+            dst.writestr(zipfile.ZipInfo(info.filename, date_time=STABLE_ZIP_TIME), body,
+                         compress_type=zipfile.ZIP_DEFLATED)
+    return out.getvalue()
+
+
+# ── 통합문서 ────────────────────────────────────────────────
+def build_workbook(df: pd.DataFrame, group: pd.DataFrame, excluded_disp_all: pd.DataFrame,
+                   top_amt: pd.DataFrame, top_cnt: pd.DataFrame, workers: int = 1, prof=None,
+                   cancel=None) -> bytes:
+    """
+    ✅ write-only(스트리밍) 통합문서 → xlsx bytes
+    - 행을 만드는 즉시 임시 파일로 흘려보내므로 행 수가 늘어도 메모리가 거의 일정
+    - 레이아웃: 요약(TOP3/수금자별 요약/제외 목록) + 수금자별 시트(표/총합계/제외 계약)
+    - workers > 1: 수금자 시트를 프로세스 풀에서 렌더링 후 시트 순서대로 합침(결과 바이트 동일)
+    - prof(instrument.Profiler)를 주면 시트 렌더링 / 저장 단계를 따로 기록
+    - cancel(threading.Event)이 켜지면 시트 사이 / 긴 표 중간에서 jobs.JobCancelled
+    """
+    wb = Workbook(write_only=True)
+    try:
+        with stage(prof, "render_sheets", len(df)):
+            replace = _render_workbook(wb, df, group, excluded_disp_all, top_amt, top_cnt, workers, cancel)
+        check_cancelled(cancel)
+    except JobCancelled:
+        # 쓰다 만 시트의 임시 파일/스트림 정리
+        for ws in wb.worksheets:
+            ws.close()
+        raise
+    with stage(prof, "wb.save", len(df)):
+        buf = BytesIO()
+        wb.save(buf)
+        return stable_xlsx_bytes(buf.getvalue(), replace)
+
+
+def _render_workbook(wb, df, group, excluded_disp_all, top_amt, top_cnt, workers, cancel=None):
+    """build_workbook 본체: 시트를 wb 에 채움 → 병렬 렌더링 시트 XML {zip 경로: 바이트}"""
+    register_named_styles(wb)
+    ws_summary = wb.create_sheet(title="요약")
+    out = SheetStream(ws_summary, 1, cancel=cancel)
+
+    top_amt_x = top_amt.copy()
+    top_amt_x["환산금액합계"] = top_amt_x["환산금액합계"].map(format_money)
+
+    # ✅ 전체 요약표에서는 순위 컬럼 제거
+    summary_fmt = group.copy().drop(columns=["환산금액순위", "건수순위"], errors="ignore")
+    summary_fmt["실적보험료합계"] = summary_fmt["실적보험료합계"].map(format_money)
+    summary_fmt["환산금액합계"] = summary_fmt["환산금액합계"].map(format_money)
+    summary_fmt = summary_fmt.sort_values(["환산금액합계", "건수", "수금자명"], ascending=[False, False, True])
+
+    # 열 너비: 나중에 쓰는 표가 앞 표의 너비를 덮어씀(기존 배치와 동일)
+    widths = {}
+    for part in (top_amt_x, top_cnt, summary_fmt, excluded_disp_all if not excluded_disp_all.empty else None):
+        widths.update(column_widths(part, padding=5))
+    apply_column_widths(ws_summary, widths)
+
+    r = 1
+    out.title(r, "환산금액합계 TOP3(동률 포함)")
+    r = write_table(out, top_amt_x, start_row=r + 1, name_suffix="TOPAMT") + 2
+
+    out.title(r, "건수 TOP3(동률 포함)")
+    r = write_table(out, top_cnt, start_row=r + 1, name_suffix="TOPCNT") + 2
+
+    out.title(r, "수금자별 요약(전체)")
+    r = write_table(out, summary_fmt, start_row=r + 1, name_suffix="SUM") + 1
+
+    if not excluded_disp_all.empty:
+        out.title(r + 1, "제외 계약 목록")
+        _ = write_table(out, excluded_disp_all, start_row=r + 2, name_suffix="EXC")
+
+    # 수금자별 시트 생성(필터된 df 기준)
+    # 유효/제외 표를 한 번씩만 분할하고, 서식·합계도 전체에 한 번만 적용한 뒤 조각만 꺼내 씀
+    parts = partition_by_collector(df)
+    ex_parts = partition_by_collector(excluded_disp_all)
+    styled_all = to_styled(df)
+    totals = sums_by_collector(df)
+
+    parallel = workers > 1 and len(parts) >= PARALLEL_MIN_SHEETS
+    jobs = []
+    for collector in sorted(parts):
+        check_cancelled(cancel)
+        ws = wb.create_sheet(title=unique_sheet_name(wb, collector))
+        sheet_no = len(wb.sheetnames)
+
+        styled_sub = styled_all.iloc[parts[collector]]
+        ex_idx = ex_parts.get(collector)
+        ex_sub = excluded_disp_all.iloc[ex_idx] if ex_idx is not None else excluded_disp_all.iloc[0:0]
+        perf, score = (float(v) for v in totals.loc[collector])
+
+        # 병렬 모드: 여기서는 표/너비 뼈대만 만들고 셀은 작업 프로세스가 렌더링
+        render_collector_sheet(SheetStream(ws, sheet_no, rows=not parallel, cancel=cancel), styled_sub, ex_sub, perf, score)
+        if parallel:
+            jobs.append((sheet_no, ws.title, styled_sub, ex_sub, perf, score))
+
+    replace = {}
+    if parallel:
+        check_cancelled(cancel)
+        n_chunks = min(len(jobs), workers * 4)
+        chunks = [jobs[i::n_chunks] for i in range(n_chunks)]
+        # spawn: Streamlit 서버 스레드와 fork가 섞이지 않도록
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+            for chunk, sheets_xml in zip(chunks, pool.map(render_sheet_chunk, chunks)):
+                for job, xml in zip(chunk, sheets_xml):
+                    replace[sheet_xml_path(job[0])] = xml
+    return replace
+
+
+def build_summary_workbook(files: pd.DataFrame, ranking: pd.DataFrame) -> bytes:
+    """
+    일괄 처리 통합 요약 → xlsx bytes
+    - 파일별 합계(건수/제외/수금자 수/금액/상태) + 전체 파일 합산 수금자 순위
+    """
+    wb = Workbook(write_only=True)
+    register_named_styles(wb)
+    ws = wb.create_sheet(title="통합요약")
+    out = SheetStream(ws, 1)
+
+    files_fmt = files.copy()
+    ranking_fmt = ranking.copy()
+    for part in (files_fmt, ranking_fmt):
+        for c in ["실적보험료합계", "환산금액합계"]:
+            if c in part.columns:
+                part[c] = part[c].map(format_money)
+
+    widths = {}
+    for part in (ranking_fmt, files_fmt):
+        widths.update(column_widths(part, padding=5))
+    apply_column_widths(ws, widths)
+
+    out.title(1, "파일별 합계")
+    r = write_table(out, files_fmt, start_row=2, name_suffix="FILES") + 2
+    if not ranking_fmt.empty:
+        out.title(r, "수금자 순위(전체 파일 합산)")
+        write_table(out, ranking_fmt, start_row=r + 1, name_suffix="RANK")
+
+    buf = BytesIO()
+    wb.save(buf)
+    return stable_xlsx_bytes(buf.getvalue())
+
@@ -0,0 +1,239 @@
+"""
+일일 업로드 증분 재계산(Streamlit 비의존)
+- 계약 키(수금자·계약일·보험사·상품명 + 같은 키 안의 순번) 해시로 이전 업로드와 행을 맞춤
+- 행 내용 해시가 같으면 이전 점수 결과를 그대로 옮기고, 추가/변경 행만 다시 점수 계산
+- 점수 계산은 행 단위(다른 행에 의존하지 않음)라 증분 결과는 전체 재계산과 같음
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+# ── 상수 ────────────────────────────────────────────────────
+# 계약 식별 컬럼(원본 컬럼명) — 이 값이 같고 나머지가 바뀌면 '변경'
+KEY_COLUMNS = ["수금자명", "계약일", "보험사", "상품명"]
+
+# 여러 지점 파일 합칠 때 같은 계약으로 보는 컬럼(계약 키 + 납입기간/보험료)
+DEDUP_KEY_COLUMNS = KEY_COLUMNS + ["납입기간", "초회보험료"]
+# 여러 지점 파일 합치기 전 값 맞춤 — 숫자/날짜 컬럼은 dtype 과 무관하게 같은 값이면 같은 키
+# (빈 칸 하나로 int64 → float64, 날짜가 문자열로 읽힌 파일 등)
+DEDUP_NUMBER_COLUMNS = ["납입기간", "초회보험료"]
+DEDUP_DATE_COLUMNS = ["계약일"]
+
+CHANGE_ADDED = "추가"
+CHANGE_REMOVED = "삭제"
+CHANGE_CHANGED = "변경"
+
+
+# ── 상태 ────────────────────────────────────────────────────
+@dataclass
+class ScoreState:
+    """한 업로드의 점수 결과 + 다음 업로드와 맞춰 볼 키"""
+    file_hash: str
+    rules_fingerprint: str
+    raw: pd.DataFrame                # 원본(RangeIndex 0..n-1)
+    keys: np.ndarray                 # 계약 키 해시(uint64, 원본 행 순서)
+    row_hashes: np.ndarray           # 행 내용 해시(uint64, 원본 행 순서)
+    dtypes: tuple                    # 원본 컬럼 dtype(바뀌면 증분 불가)
+    scored: pd.DataFrame             # 유효 계약 점수표(인덱스 = 원본 행 위치)
+    excluded: pd.DataFrame           # 제외 계약(인덱스 = 원본 행 위치)
+    agg: pd.DataFrame                # 수금자별 건수/실적보험료합계/환산금액합계(인덱스 = 수금자명)
+    positions: dict = None           # 수금자명(문자열) → scored 행 위치(처음 필요할 때 채움)
+    rollup: object = None            # 수금자 × 일 합계(rollups.DailyRollup, 처음 필요할 때 채움)
+
+
+@dataclass
+class UploadDiff:
+    """이전 업로드 → 새 업로드 행 대응"""
+    prev_pos: np.ndarray             # 새 행별 이전 행 위치(-1 = 추가)
+    same: np.ndarray                 # 새 행별 내용 동일 여부
+    removed: np.ndarray              # 새 업로드에 없는 이전 행 위치
+    prev_len: int
+
+    @property
+    def added(self) -> np.ndarray:
+        return np.flatnonzero(self.prev_pos < 0)
+
+    @property
+    def changed(self) -> np.ndarray:
+        return np.flatnonzero((self.prev_pos >= 0) & ~self.same)
+
+    @property
+    def rescore(self) -> np.ndarray:
+        """다시 점수 계산할 새 행 위치(추가 + 변경)"""
+        return np.flatnonzero(~self.same)
+
+    @property
+    def new_pos_of_prev(self) -> np.ndarray:
+        """이전 행별 새 행 위치(내용이 같은 행만, 나머지 -1)"""
+        out = np.full(self.prev_len, -1, dtype=np.int64)
+        out[self.prev_pos[self.same]] = np.flatnonzero(self.same)
+        return out
+
+    def counts(self) -> dict:
+        return {
+            CHANGE_ADDED: len(self.added),
+            CHANGE_REMOVED: len(self.removed),
+            CHANGE_CHANGED: len(self.changed),
+        }
+
+
+# ── 키/비교 ─────────────────────────────────────────────────
+_MIX = np.uint64(0x100000001B3)
+
+
+def column_hashes(s: pd.Series) -> np.ndarray:
+    """
+    컬럼 값 → 행별 uint64 해시(값만으로 정해지므로 업로드가 달라도 같은 값은 같은 해시)
+    - 문자열/혼합 컬럼은 값 종류별로 한 번만 해시하고 코드로 펼침
+    """
+    if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+        return pd.util.hash_pandas_object(s, index=False).to_numpy()
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    hashed = pd.util.hash_array(np.asarray(uniques, dtype=object), categorize=False)
+    return hashed[codes]
+
+
+def combine_hashes(hashes) -> np.ndarray:
+    out = None
+    for h in hashes:
+        out = h.copy() if out is None else (out * _MIX) ^ h
+    return out
+
+
+def contract_keys(raw: pd.DataFrame, columns=KEY_COLUMNS, per_column=None) -> np.ndarray:
+    """
+    원본 → 계약 키 해시(uint64)
+    - 같은 계약 키가 여러 행이면 나온 순서대로 순번을 붙여 구분
+    """
+    per_column = per_column or {}
+    keys = combine_hashes(per_column[c] if c in per_column else column_hashes(raw[c]) for c in columns)
+    dup = pd.Index(keys).duplicated(keep=False)
+    if dup.any():
+        # 첫 행은 키 그대로, 두 번째부터 순번을 섞음(중복 없는 행의 키는 업로드와 무관)
+        occurrence = pd.Series(keys[dup]).groupby(keys[dup]).cumcount().to_numpy()
+        later = occurrence > 0
+        idx = np.flatnonzero(dup)[later]
+        keys[idx] = combine_hashes([keys[idx], pd.util.hash_array(occurrence[later])])
+    return keys
+
+
+def canonical_hashes(s: pd.Series, kind: str = "text") -> np.ndarray:
+    """
+    컬럼 값 → 값을 한 가지 문자열로 맞춘 뒤 행별 uint64 해시(dtype 이 달라도 같은 값은 같은 해시)
+    - kind: number(150000 / 150000.0 / ' 150000' → '150000.0') / date(Timestamp·날짜 문자열 → ISO) / text(앞뒤 공백 제거)
+    - 숫자/날짜로 읽히지 않는 값은 공백만 뗀 문자열, 빈 값은 ''
+    - 값 종류별로 한 번만 변환하고 코드로 펼침
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    values = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    text = values.map(lambda v: str(v).strip(), na_action="ignore")
+    canon = text.copy()
+    if kind == "number":
+        parsed = pd.to_numeric(text, errors="coerce").astype("float64")
+        ok = parsed.notna()
+        canon[ok] = parsed[ok].map(repr)
+    elif kind == "date":
+        parsed = pd.to_datetime(values.where(values.map(lambda v: not isinstance(v, str)), text),
+                                errors="coerce", format="mixed")
+        ok = parsed.notna()
+        canon[ok] = parsed[ok].map(pd.Timestamp.isoformat)
+    canon = canon.where(canon.notna(), "")
+    hashed = pd.util.hash_array(canon.to_numpy(dtype=object), categorize=False)
+    return hashed[codes]
+
+
+def dedup_keys(raw: pd.DataFrame) -> np.ndarray:
+    """원본 → 여러 파일 합칠 때 쓰는 계약 키 해시(DEDUP_KEY_COLUMNS, 값 맞춤 후 해시)"""
+    kinds = {**{c: "number" for c in DEDUP_NUMBER_COLUMNS}, **{c: "date" for c in DEDUP_DATE_COLUMNS}}
+    per_column = {c: canonical_hashes(raw[c], kinds.get(c, "text")) for c in DEDUP_KEY_COLUMNS}
+    return contract_keys(raw, DEDUP_KEY_COLUMNS, per_column)
+
+
+def row_keys(raw: pd.DataFrame):
+    """원본 → (계약 키 해시, 행 내용 해시)"""
+    per_column = {c: column_hashes(raw[c]) for c in raw.columns}
+    keys = contract_keys(raw, KEY_COLUMNS, per_column)
+    row_hashes = combine_hashes(per_column.values())
+    return keys, row_hashes
+
+
+def raw_dtypes(raw: pd.DataFrame) -> tuple:
+    return tuple((str(c), str(t)) for c, t in raw.dtypes.items())
+
+
+def diff_uploads(prev: ScoreState, keys: np.ndarray, row_hashes: np.ndarray):
+    """이전 상태와 새 키 비교 → UploadDiff (키가 겹치면 None: 전체 재계산)"""
+    prev_index = pd.Index(prev.keys)
+    if not prev_index.is_unique or not pd.Index(keys).is_unique:
+        return None
+    prev_pos = prev_index.get_indexer(keys)
+    matched = prev_pos >= 0
+    same = np.zeros(len(keys), dtype=bool)
+    same[matched] = prev.row_hashes[prev_pos[matched]] == row_hashes[matched]
+
+    seen = np.zeros(len(prev.keys), dtype=bool)
+    seen[prev_pos[matched]] = True
+    return UploadDiff(prev_pos=prev_pos, same=same, removed=np.flatnonzero(~seen), prev_len=len(prev.keys))
+
+
+# ── 결과 합치기 ─────────────────────────────────────────────
+def merge_rows(prev_frame: pd.DataFrame, delta: pd.DataFrame, diff: UploadDiff) -> pd.DataFrame:
+    """
+    이전 결과 중 내용이 같은 행 + 다시 계산한 행 → 새 원본 행 순서
+    - 인덱스(원본 행 위치)를 새 위치로 바꾼 뒤 행 선택+정렬을 take 한 번으로
+    - 빈 쪽은 합치지 않음(dtype 판정에서 뺌)
+    - 범주형 컬럼은 양쪽 범주를 맞춰 합치고 쓰이지 않는 범주는 뺌(전체 재계산과 같은 dtype)
+    """
+    target = []
+    parts = []
+    if not prev_frame.empty:
+        target.append(diff.new_pos_of_prev[prev_frame.index.to_numpy()])
+        parts.append(prev_frame)
+    if not delta.empty:
+        target.append(delta.index.to_numpy())
+        parts.append(delta)
+    if not parts:
+        return delta
+    categorical = [c for c in parts[0].columns if isinstance(parts[0][c].dtype, pd.CategoricalDtype)]
+    if len(parts) > 1:
+        parts = _align_categories(parts, categorical)
+    combined = pd.concat(parts) if len(parts) > 1 else parts[0]
+    target = np.concatenate(target)
+
+    keep = np.flatnonzero(target >= 0)
+    order = keep[np.argsort(target[keep], kind="stable")]
+    out = combined.take(order)
+    out.index = target[order]
+    for c in categorical:
+        out[c] = out[c].cat.remove_unused_categories()
+    return out
+
+
+def _align_categories(parts: list, columns: list) -> list:
+    """범주형 컬럼마다 모든 조각의 범주 합집합(정렬)으로 맞춤 — concat 이 object 로 풀리지 않게"""
+    aligned = [p.copy(deep=False) for p in parts]
+    for c in columns:
+        if not all(isinstance(p[c].dtype, pd.CategoricalDtype) for p in parts):
+            continue
+        categories = parts[0][c].cat.categories
+        for p in parts[1:]:
+            categories = categories.union(p[c].cat.categories)
+        for p in aligned:
+            p[c] = p[c].cat.set_categories(categories)
+    return aligned
+
+
+def change_list(prev_raw: pd.DataFrame, raw: pd.DataFrame, diff: UploadDiff) -> pd.DataFrame:
+    """화면 표시용 변경 계약 목록(변경은 새 값 기준)"""
+    parts = [
+        raw.iloc[diff.added].assign(변경구분=CHANGE_ADDED),
+        prev_raw.iloc[diff.removed].assign(변경구분=CHANGE_REMOVED),
+        raw.iloc[diff.changed].assign(변경구분=CHANGE_CHANGED),
+    ]
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=["변경구분", *raw.columns])
+    out = pd.concat(parts, ignore_index=True)
+    return out[["변경구분", *raw.columns]]
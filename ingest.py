@@ -0,0 +1,308 @@
+"""
+계약 목록(.xlsx) 읽기 단계(Streamlit 비의존)
+- 워크시트 XML을 스트리밍으로 훑으며 필요한 10개 컬럼만 변환
+- 결과는 내용 해시 키로 디스크 컬럼 캐시(Arrow IPC)에 저장 → 같은 파일은 메모리 매핑으로 재사용
+  (결과 캐시 디스크 단과 같은 규칙: 용량 한도 + LRU 축출, TTL 지난 파일 무효)
+- 빠른 경로가 실패하면 기존 pd.read_excel 로 대체
+- 기존 리더와의 패리티는 test_ingest.py 에서 확인
+"""
+import hashlib
+import os
+import posixpath
+import time
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+from openpyxl.xml.functions import fromstring
+from openpyxl.cell.text import Text
+
+from result_cache import TTL_SECONDS, trim_dir
+
+try:
+    from lxml.etree import iterparse
+    LXML = True
+except ImportError:  # lxml 없으면 표준 라이브러리(느리지만 동일 결과)
+    from xml.etree.ElementTree import iterparse
+    LXML = False
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow 없으면 디스크 캐시 없이 동작
+    pa = None
+
+
+# ── 상수 ────────────────────────────────────────────────────
+COLUMNS_NEEDED = [
+    "수금자명", "계약일", "보험사", "상품명", "납입기간",
+    "초회보험료", "쉐어율", "납입방법", "상품군2", "계약상태"
+]
+
+# 디스크 캐시 위치(여러 서버/재시작 간 공유하려면 공유 볼륨 경로 지정)
+CACHE_DIR = os.environ.get(
+    "CONTRACT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ingest"),
+)
+CACHE_VERSION = 1  # 읽기 규칙/저장 형식이 바뀌면 올림 → 기존 캐시 무효
+CACHE_BUDGET_MB = float(os.environ.get("CONTRACT_CACHE_MB", 2048))
+CACHE_SUFFIX = ".arrow"
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+ROW_TAG = f"{{{NS_MAIN}}}row"
+CELL_TAG = f"{{{NS_MAIN}}}c"
+VALUE_TAG = f"{{{NS_MAIN}}}v"
+INLINE_TAG = f"{{{NS_MAIN}}}is"
+TEXT_TAG = f"{{{NS_MAIN}}}t"
+DIGITS = "0123456789"
+
+
+# ── 유틸 ────────────────────────────────────────────────────
+def file_digest(file_bytes: bytes) -> str:
+    """업로드 파일 내용 해시(캐시 키용)"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def _first_worksheet_path(zf: zipfile.ZipFile) -> str:
+    """workbook.xml 순서상 첫 워크시트(pd.read_excel sheet_name=0 과 동일)"""
+    book = fromstring(zf.read("xl/workbook.xml"))
+    rels = fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {
+        r.get("Id"): r.get("Target")
+        for r in rels.iter(f"{{{NS_PKG_REL}}}Relationship")
+        if r.get("Type", "").endswith("/worksheet")
+    }
+    for sheet in book.iter(f"{{{NS_MAIN}}}sheet"):
+        target = targets.get(sheet.get(f"{{{NS_REL}}}id"))
+        if target:
+            return target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"xl/{target}")
+    raise ValueError("워크시트를 찾을 수 없습니다.")
+
+
+def _epoch(zf: zipfile.ZipFile):
+    pr = fromstring(zf.read("xl/workbook.xml")).find(f"{{{NS_MAIN}}}workbookPr")
+    date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+    return CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+
+def _date_styles(zf: zipfile.ZipFile):
+    try:
+        sheet = Stylesheet.from_tree(fromstring(zf.read("xl/styles.xml")))
+    except KeyError:
+        return set(), set()
+    return sheet.date_formats, sheet.timedelta_formats
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> list:
+    try:
+        with zf.open("xl/sharedStrings.xml") as src:
+            return read_string_table(src)
+    except KeyError:
+        return []
+
+
+# ── 빠른 경로: 워크시트 XML 스트리밍 ────────────────────────
+def read_xlsx_columns(file_bytes: bytes, columns=COLUMNS_NEEDED) -> pd.DataFrame:
+    """
+    ✅ 첫 시트에서 columns 만 읽기(pd.read_excel(usecols=columns) 와 같은 결과)
+    - 셀 변환 규칙은 openpyxl 읽기 전용 모드 + pandas _convert_cell 과 동일
+    - 필요 없는 열의 셀은 값 변환 없이 '행에 값이 있는지'만 확인
+    - 1행 머리글에 columns 가 모두 없으면 ValueError(호출 측에서 기존 리더로 대체)
+    """
+    with zipfile.ZipFile(BytesIO(file_bytes)) as zf:
+        shared = _shared_strings(zf)
+        date_styles, timedelta_styles = _date_styles(zf)
+        epoch = _epoch(zf)
+
+        def convert(cell):
+            t = cell.get("t", "n")
+            if t == "inlineStr":
+                node = cell.find(INLINE_TAG)
+                if node is None:
+                    return ""
+                if len(node) == 1 and node[0].tag == TEXT_TAG:
+                    return node[0].text or ""
+                return Text.from_tree(node).content  # 서식 있는 문자열(run 여러 개)
+            v = cell.findtext(VALUE_TAG) or None
+            if v is None:
+                return ""
+            if t == "n":
+                num = float(v) if ("." in v or "E" in v or "e" in v) else int(v)
+                style = int(cell.get("s", 0))
+                if style in date_styles:
+                    try:
+                        return from_excel(num, epoch, timedelta=style in timedelta_styles)
+                    except (OverflowError, ValueError):
+                        return float("nan")
+                return int(num) if int(num) == num else float(num)
+            if t == "s":
+                return shared[int(v)]
+            if t == "b":
+                return bool(int(v))
+            if t == "e":
+                return float("nan")
+            if t == "d":
+                return from_ISO8601(v)
+            return v  # "str"(수식 결과 문자열)
+
+        col_cache = {}
+        pick = None      # {열 번호: 출력 위치}
+        header = None
+        rows = []
+        last_with_data = -1
+        row_no = 0
+
+        with zf.open(_first_worksheet_path(zf)) as src:
+            events = iterparse(src, events=("end",), tag=ROW_TAG) if LXML else iterparse(src, events=("end",))
+            for _, elem in events:
+                if elem.tag != ROW_TAG:
+                    continue
+
+                r_attr = elem.get("r")
+                idx = int(r_attr) if r_attr else row_no + 1
+                # 중간에 빠진 행은 빈 행(openpyxl 과 동일)
+                while row_no < idx - 1:
+                    row_no += 1
+                    if pick is not None:
+                        rows.append([""] * len(pick))
+                row_no = idx
+
+                values = {}
+                has_data = False
+                col_no = 0
+                for cell in elem:
+                    if cell.tag != CELL_TAG:
+                        continue
+                    coord = cell.get("r")
+                    if coord:
+                        letters = coord.rstrip(DIGITS)
+                        col_no = col_cache.get(letters) or col_cache.setdefault(
+                            letters, column_index_from_string(letters))
+                    else:
+                        col_no += 1
+
+                    if pick is None or col_no in pick:
+                        value = convert(cell)
+                        values[col_no] = value
+                        has_data = has_data or not (isinstance(value, str) and value == "")
+                    elif not has_data:
+                        has_data = convert(cell) != ""
+
+                if pick is None:
+                    # 1행 = 머리글: 필요한 컬럼 위치 확정(중복 머리글은 첫 번째)
+                    if row_no != 1:
+                        raise ValueError("1행에 머리글이 없습니다.")
+                    positions = {}
+                    for c in sorted(values):
+                        positions.setdefault(values[c], c)
+                    missing = [c for c in columns if c not in positions]
+                    if missing:
+                        raise ValueError(f"머리글에 없는 컬럼: {missing}")
+                    ordered = sorted(positions[c] for c in columns)
+                    pick = {c: i for i, c in enumerate(ordered)}
+                    header = [values[c] for c in ordered]
+                else:
+                    rows.append([values.get(c, "") for c in pick])
+
+                if has_data:
+                    last_with_data = len(rows)
+
+                # 처리한 행은 즉시 해제(메모리 일정)
+                elem.clear()
+                if hasattr(elem, "getprevious"):
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+
+        if header is None:
+            raise ValueError("빈 시트입니다.")
+
+        # 값이 있는 마지막 행 이후 제거(pandas 와 동일)
+        del rows[max(last_with_data, 0):]
+        return TextParser([header] + rows, header=0, skip_blank_lines=False).read()
+
+
+def read_excel_fallback(file_bytes: bytes, columns=COLUMNS_NEEDED) -> pd.DataFrame:
+    """기존 리더(pd.read_excel + openpyxl)"""
+    return pd.read_excel(BytesIO(file_bytes), usecols=columns)
+
+
+# ── 디스크 컬럼 캐시 ─────────────────────────────────────────
+def cache_key(file_bytes: bytes, columns=COLUMNS_NEEDED) -> str:
+    """내용 해시 + 읽은 컬럼 목록"""
+    cols = hashlib.sha256("|".join(columns).encode()).hexdigest()[:8]
+    return f"{file_digest(file_bytes)}-{cols}"
+
+
+def _cache_path(key: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{key}.v{CACHE_VERSION}{CACHE_SUFFIX}")
+
+
+def read_cached(key: str, cache_dir: str = CACHE_DIR):
+    """캐시 파일을 메모리 매핑으로 읽기(없거나 깨졌거나 TTL 지났으면 None)"""
+    if pa is None:
+        return None
+    path = _cache_path(key, cache_dir)
+    try:
+        stored = os.stat(path).st_mtime
+        if time.time() - stored > TTL_SECONDS:
+            os.remove(path)
+            return None
+        with pa.memory_map(path, "r") as src:
+            df = pa.ipc.open_file(src).read_all().to_pandas()
+        os.utime(path, (time.time(), stored))  # LRU: 접근 시각만 갱신, 저장 시각 유지
+        return df
+    except (OSError, pa.ArrowException):
+        return None
+
+
+def write_cached(key: str, df: pd.DataFrame, cache_dir: str = CACHE_DIR) -> bool:
+    """
+    Arrow IPC 파일로 저장(임시 파일 → rename 으로 원자적 교체) 후 폴더를 한도 안으로 정리
+    - 한 컬럼에 문자/숫자가 섞여 Arrow로 옮길 수 없으면 저장하지 않음
+    """
+    if pa is None:
+        return False
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, TypeError, ValueError):
+        return False
+
+    path = _cache_path(key, cache_dir)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    trim_dir(cache_dir, CACHE_SUFFIX, int(CACHE_BUDGET_MB * 2**20), TTL_SECONDS)
+    return True
+
+
+# ── 진입점 ──────────────────────────────────────────────────
+def load_contracts(file_bytes: bytes, columns=COLUMNS_NEEDED, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """
+    ✅ 캐시 → 빠른 경로 → 기존 리더 순서로 시도
+    - 기존 리더까지 실패하면 그 예외를 그대로 올림(기존 동작과 동일)
+    """
+    key = cache_key(file_bytes, columns)
+    cached = read_cached(key, cache_dir)
+    if cached is not None:
+        return cached
+
+    try:
+        df = read_xlsx_columns(file_bytes, columns)
+    except Exception:
+        df = read_excel_fallback(file_bytes, columns)
+
+    write_cached(key, df, cache_dir)
+    return df
@@ -0,0 +1,188 @@
+"""
+단계별 성능 기록(Streamlit 비의존)
+- 단계마다 실행 시간 / 입력·출력 행 수 / 최대 메모리 증가량 / 캐시 적중 여부
+- 한 번의 실행(rerun) 기록은 구조화 로그(JSON Lines)로 남김
+- 결과 캐시(result_cache) 단계 함수의 적중/미적중 횟수는 프로세스 전체에서 누적
+"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# ── 상수 ────────────────────────────────────────────────────
+LOG_PATH = os.environ.get(
+    "CONTRACT_PERF_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "perf.jsonl"),
+)
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+
+
+# ── 메모리 ──────────────────────────────────────────────────
+def _rss() -> int:
+    """현재 프로세스 RSS(바이트, /proc 없으면 0)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class PeakMemory:
+    """
+    구간 최대 메모리 증가량(MB)
+    - RSS 를 짧은 간격으로 샘플링(pyarrow 등 파이썬 밖 할당 포함)
+    - /proc 이 없으면 tracemalloc(파이썬/numpy 할당만)
+    """
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.peak_mb = 0.0
+
+    def __enter__(self):
+        self._start = _rss()
+        self._peak = self._start
+        self._stop = threading.Event()
+        self._traced = False
+        if self._start:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        elif not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._traced = True
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, _rss())
+
+    def __exit__(self, *exc):
+        if self._start:
+            self._stop.set()
+            self._thread.join()
+            self._peak = max(self._peak, _rss())
+            self.peak_mb = (self._peak - self._start) / 2**20
+        elif self._traced:
+            self.peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        return False
+
+
+# ── 캐시 적중 ───────────────────────────────────────────────
+_cache_lock = threading.Lock()
+_cache_counts = {}
+_cache_local = threading.local()
+
+
+def note_cache_miss():
+    """결과 캐시 계산 함수(get_or_compute 의 compute) 첫 줄에서 호출(계산이 실행됐다 = 미적중)"""
+    _cache_local.missed = True
+
+
+def count_cache(name: str, missed: bool):
+    with _cache_lock:
+        counts = _cache_counts.setdefault(name, {CACHE_HIT: 0, CACHE_MISS: 0})
+        counts[CACHE_MISS if missed else CACHE_HIT] += 1
+
+
+def cache_counts() -> dict:
+    """{함수명: {'hit': n, 'miss': n}} (프로세스 시작 후 누적)"""
+    with _cache_lock:
+        return {name: dict(c) for name, c in _cache_counts.items()}
+
+
+# ── 단계 기록 ───────────────────────────────────────────────
+class Profiler:
+    """
+    한 번의 실행에서 단계별 기록을 모음
+    - enabled=False 면 기록/메모리 측정 없이 함수만 실행(켜지 않았을 때 부담 없음)
+    - 단계는 중첩 가능(depth 로 구분), 기록 순서는 시작 순서
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.records = []
+        self.context = {}                # 로그에 함께 남길 값(업로드 해시 등)
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name: str, rows_in=None):
+        """
+        with prof.stage("score", len(raw)) as rec:
+            ...
+            rec["rows_out"] = len(out)
+        """
+        rec = {"stage": name, "depth": self._depth, "seconds": 0.0, "rows_in": rows_in,
+               "rows_out": None, "peak_mb": 0.0, "cache": None}
+        if not self.enabled:
+            yield rec
+            return
+        self.records.append(rec)
+        self._depth += 1
+        try:
+            with PeakMemory() as mem:
+                t0 = time.perf_counter()
+                try:
+                    yield rec
+                finally:
+                    rec["seconds"] = time.perf_counter() - t0
+            rec["peak_mb"] = mem.peak_mb
+        finally:
+            self._depth -= 1
+
+    def cached(self, name: str, fn, *args, rows_in=None, **kwargs):
+        """
+        결과 캐시를 쓰는 단계 함수 호출 + 적중 여부 기록(메모리·디스크 적중 모두 적중)
+        - fn 본문이 note_cache_miss() 를 부르면 미적중
+        - 출력 행 수는 반환값(표, 또는 튜플의 첫 표)에서 채움
+        """
+        _cache_local.missed = False
+        with self.stage(name, rows_in) as rec:
+            out = fn(*args, **kwargs)
+            rec["rows_out"] = _rows(out[0] if isinstance(out, tuple) and out else out)
+        missed = getattr(_cache_local, "missed", False)
+        count_cache(name, missed)
+        rec["cache"] = CACHE_MISS if missed else CACHE_HIT
+        return out
+
+    def log(self, path: str = LOG_PATH):
+        """기록을 JSON 한 줄로 로그 파일에 추가"""
+        if not self.enabled or not self.records:
+            return
+        _file_logger(path).info(json.dumps({
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **self.context,
+            "stages": self.records,
+            "cache": cache_counts(),
+        }, ensure_ascii=False, default=str))
+
+
+def _rows(obj):
+    shape = getattr(obj, "shape", None)
+    return int(shape[0]) if shape else None
+
+
+def stage(prof, name: str, rows_in=None):
+    """prof 가 None 이어도 쓸 수 있는 단계 기록(파이프라인 함수용)"""
+    return (prof or _NULL).stage(name, rows_in)
+
+
+_NULL = Profiler(enabled=False)
+
+
+def _file_logger(path: str) -> logging.Logger:
+    logger = logging.getLogger(f"contract.perf.{path}")
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
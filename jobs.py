@@ -0,0 +1,99 @@
+"""
+백그라운드 작업(Streamlit 비의존)
+- 읽기 → 환산 → 순위 → 색인 / 엑셀 생성 같은 단계를 별도 스레드에서 순서대로 실행
+- 화면 스레드는 막히지 않고 끝난 단계 결과부터 꺼내 그림(job.has / job.result)
+- 취소는 협조적: 단계 사이마다 확인하고, 긴 단계 안에서는 cancel_event 를 직접 확인(check_cancelled)
+- 단계 함수는 streamlit 을 부르지 않음(세션 상태 반영은 화면 스레드에서)
+"""
+import threading
+import time
+
+
+# ── 상수 ────────────────────────────────────────────────────
+STATUS_RUNNING = "실행 중"
+STATUS_DONE = "완료"
+STATUS_CANCELLED = "취소"
+STATUS_FAILED = "실패"
+
+
+class JobCancelled(Exception):
+    """작업이 취소됨(단계 안에서 올리면 남은 단계 없이 끝남)"""
+
+
+def check_cancelled(cancel_event):
+    """긴 단계 안에서 주기적으로 호출 — 취소됐으면 JobCancelled"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled()
+
+
+# ── 작업 ────────────────────────────────────────────────────
+class Job:
+    """
+    단계 목록을 백그라운드 스레드에서 순서대로 실행
+    - stages: [(단계 이름, fn)] — fn(job) 반환값이 job.results[이름]
+    - key: 같은 입력인지 비교하는 값(화면에서 같은 key 면 작업을 새로 만들지 않음)
+    - prof(instrument.Profiler)를 주면 작업이 끝날 때 기록을 로그에 남김
+    """
+
+    def __init__(self, key, stages: list, prof=None):
+        self.key = key
+        self.stages = stages
+        self.prof = prof
+        self.results = {}
+        self.finished = []               # 끝난 단계 이름(순서대로)
+        self.current = None              # 실행 중인 단계 이름
+        self.status = STATUS_RUNNING
+        self.error = None                # 실패한 단계의 예외
+        self.failed_stage = None
+        self.cancel_event = threading.Event()
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"job-{id(self):x}", daemon=True)
+
+    def start(self) -> "Job":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for name, fn in self.stages:
+                check_cancelled(self.cancel_event)
+                self.current = name
+                self.results[name] = fn(self)
+                self.finished.append(name)
+            self.status = STATUS_DONE
+        except JobCancelled:
+            self.status = STATUS_CANCELLED
+        except Exception as err:  # 화면 스레드에서 보여줄 수 있게 보관
+            self.error = err
+            self.failed_stage = self.current
+            self.status = STATUS_FAILED
+        finally:
+            self.current = None
+            if self.prof is not None:
+                self.prof.log()
+
+    def cancel(self):
+        """취소 요청(실행 중인 단계는 다음 확인 지점에서 멈춤)"""
+        self.cancel_event.set()
+
+    @property
+    def running(self) -> bool:
+        return self.status == STATUS_RUNNING
+
+    @property
+    def done(self) -> bool:
+        return self.status == STATUS_DONE
+
+    @property
+    def failed(self) -> bool:
+        return self.status == STATUS_FAILED
+
+    @property
+    def progress(self) -> float:
+        return len(self.finished) / len(self.stages) if self.stages else 1.0
+
+    def has(self, name: str) -> bool:
+        return name in self.finished
+
+    def result(self, name: str):
+        return self.results[name]
@@ -0,0 +1,350 @@
+"""
+업적 환산 파이프라인(Streamlit 비의존)
+- 제외 판정 → 점수(환산) → 수금자별 합계/순위 → TOP3, 증분 재계산
+- 화면(app.py)과 일괄 처리(batch.py)가 같은 함수를 사용
+"""
+import numpy as np
+import pandas as pd
+
+from incremental import (
+    ScoreState, change_list, dedup_keys, diff_uploads, merge_rows, raw_dtypes, row_keys,
+)
+from instrument import stage
+from rules import load_rules
+
+
+# ── 상수 ────────────────────────────────────────────────────
+# 원본 → 화면/점수 컬럼명
+RENAME_COLUMNS = {"계약일": "계약일자", "초회보험료": "보험료"}
+
+# 점수 계산에 필요한 컬럼(RENAME_COLUMNS 적용 후 이름)
+REQUIRED_COLUMNS = {"수금자명", "계약일자", "보험사", "상품명", "납입기간", "보험료", "쉐어율"}
+
+# 점수표에서 범주형(값 종류별 1회 저장 + 행별 코드)으로 보관할 문자열 컬럼
+CATEGORY_COLUMNS = ["수금자명", "보험사", "상품명", "보험구분", "납입방법", "상품군2", "계약상태"]
+
+
+def missing_columns(raw: pd.DataFrame) -> list:
+    """원본에 없는 필수 컬럼(정렬된 목록, 없으면 빈 목록)"""
+    return sorted(REQUIRED_COLUMNS - set(raw.rename(columns=RENAME_COLUMNS).columns))
+
+
+# ── 여러 파일 합치기 ────────────────────────────────────────
+def merge_contracts(frames):
+    """
+    ✅ 여러 지점 파일 → 중복 계약을 뺀 하나의 원본(RangeIndex)
+    - frames: (파일명, 원본) 을 하나씩 내주는 iterable — 파일을 읽는 즉시 걸러 남길 행만 보관
+    - 같은 계약(DEDUP_KEY_COLUMNS + 파일 안 순번) 은 먼저 나온 파일 것만 남김
+      (숫자/날짜/문자열 값을 맞춘 뒤 비교 → 파일마다 dtype 이 달라도 같은 계약으로 봄)
+    - 이미 본 계약 키는 하나의 해시 집합에 모아 두고 새 파일의 키만 확인
+      (전체를 이어 붙인 뒤 drop_duplicates 하지 않음, 파일마다 이전 키를 다시 해시하지 않음)
+    - 반환: (합친 원본, 파일별 행수/반영/중복 DataFrame)
+    """
+    parts, stats, seen = [], [], set()
+    for name, raw in frames:
+        missing = missing_columns(raw)
+        if missing:
+            raise ValueError(f"{name}: 필수 컬럼 없음 ({', '.join(missing)})")
+        keys = dedup_keys(raw).tolist()
+        is_new = ~np.fromiter(map(seen.__contains__, keys), dtype=bool, count=len(keys))
+        n_new = int(is_new.sum())
+        if n_new:
+            parts.append(raw if n_new == len(raw) else raw[is_new])
+            seen.update(keys)
+        stats.append({"파일": name, "행수": len(raw), "반영": n_new, "중복": len(raw) - n_new})
+
+    stats = pd.DataFrame(stats, columns=["파일", "행수", "반영", "중복"])
+    if not parts:
+        return pd.DataFrame(), stats
+    merged = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+    return merged, stats
+
+
+# ── 제외/점수 ───────────────────────────────────────────────
+def exclusion_flags(tmp, rules=None) -> list:
+    """
+    제외 사유별 bool 마스크(rules.exclusions 순서)
+    - tmp: 판정 컬럼(DataFrame 또는 dict), 문자열 정리(strip)된 상태여야 함
+    """
+    rules = rules or load_rules()
+    return [
+        tmp[column].str.contains(pattern, regex=True, na=False).to_numpy()
+        for _, column, pattern in rules.exclusions
+    ]
+
+
+def join_reasons(flags: list, labels: list) -> np.ndarray:
+    """
+    사유 마스크들 → " / " 로 이은 사유 문자열 배열
+    - 마스크 조합을 비트 코드로 묶고, 나온 조합마다 한 번만 문자열을 만들어 펼침
+    """
+    code = np.zeros(len(flags[0]) if flags else 0, dtype=np.int64)
+    for i, f in enumerate(flags):
+        code |= f.astype(np.int64) << i
+    uniq, inverse = np.unique(code, return_inverse=True)
+    table = np.array([
+        " / ".join(label for i, label in enumerate(labels) if int(c) >> i & 1) or "제외 조건 미상"
+        for c in uniq
+    ], dtype=object)
+    return table[inverse]
+
+
+def exclude_contracts(df: pd.DataFrame, rules=None):
+    """
+    제외: 일시납 / 연금성·저축성 / 철회·해약·실효(rules.exclusions)
+    - 판정 컬럼만 정리(strip)하고 행 선택은 유효/제외 각 1회(전체 복사 없음)
+    - 제외 건에는 판정에 쓴 마스크로 만든 '제외사유' 컬럼을 함께 붙임
+    """
+    rules = rules or load_rules()
+    needed = rules.exclusion_columns
+    if not set(needed).issubset(df.columns):
+        return df.copy(), pd.DataFrame()
+
+    cols = {c: df[c].astype(str).str.strip() for c in needed}
+    flags = exclusion_flags(cols, rules)
+    is_excluded = np.logical_or.reduce(flags) if flags else np.zeros(len(df), dtype=bool)
+    is_valid = ~is_excluded
+
+    valid = df[is_valid]
+    excluded = df[is_excluded]
+    for c, s in cols.items():
+        valid[c] = s[is_valid]
+        excluded[c] = s[is_excluded]
+    excluded["제외사유"] = join_reasons([f[is_excluded] for f in flags], rules.exclusion_labels)
+    return valid, excluded
+
+
+def build_excluded_with_reason(exdf: pd.DataFrame) -> pd.DataFrame:
+    base_cols = ["수금자명", "계약일자", "보험사", "상품명", "납입기간", "보험료", "납입방법", "제외사유"]
+    if exdf is None or exdf.empty:
+        return pd.DataFrame(columns=base_cols)
+
+    out = exdf[["수금자명", "계약일", "보험사", "상품명", "납입기간", "초회보험료", "납입방법"]].copy()
+    out.rename(columns={"계약일": "계약일자", "초회보험료": "보험료"}, inplace=True)
+
+    # exclude_contracts 가 붙인 사유 재사용(없으면 같은 마스크로 계산)
+    if "제외사유" in exdf.columns:
+        out["제외사유"] = exdf["제외사유"].to_numpy()
+    else:
+        rules = load_rules()
+        tmp = exdf[rules.exclusion_columns].astype(str)
+        out["제외사유"] = join_reasons(exclusion_flags(tmp, rules), rules.exclusion_labels)
+
+    out["계약일자"] = pd.to_datetime(out["계약일자"], errors="coerce").dt.strftime("%Y-%m-%d")
+    term = pd.to_numeric(out["납입기간"], errors="coerce")
+    out["납입기간"] = (np.trunc(term.fillna(0)).astype(np.int64).astype(str) + "년").where(term.notna(), "")
+    out["보험료"] = out["보험료"].map("{:,.0f} 원".format, na_action="ignore").fillna("")
+    return out[base_cols]
+
+
+def parse_share_rate(s: pd.Series) -> pd.Series:
+    """'100%' / 100 / '50' → float(빈 값은 NaN 유지)"""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(np.float64)
+    text = s.astype(str).str.replace("%", "", regex=False)
+    return pd.Series(text.to_numpy(dtype=object).astype(np.float64), index=s.index, name=s.name)
+
+
+def add_score_columns(df: pd.DataFrame, rules=None) -> pd.DataFrame:
+    """
+    점수 컬럼을 df 에 직접 추가(복사 없음) — df 는 RENAME_COLUMNS 적용된 유효 계약
+    - 환산율: 컴파일된 규칙 표[보험사 행, 납입기간 구간]를 전체 행에 한 번에 인덱싱
+    - 작은 점수표: 문자열은 범주형, 납입기간/환산율은 작은 정수, 계약일자는 날짜 하나,
+      원본 보험료는 실적보험료와 같은 값이라 남기지 않음
+    """
+    rules = rules or load_rules()
+    term = pd.to_numeric(df["납입기간"], errors="coerce").fillna(0).astype(np.int64)
+    df["납입기간"] = pd.to_numeric(term, downcast="integer")
+    types, rows = rules.classify(df["보험사"])
+    df["보험구분"] = types
+    df["환산율"] = rules.rates(term.to_numpy(), rows)
+
+    df["쉐어율"] = parse_share_rate(df["쉐어율"])
+    df["실적보험료"] = pd.to_numeric(df["보험료"], errors="coerce").fillna(0)
+    df["환산금액"] = df["실적보험료"] * df["환산율"] / 100
+    if rules.share_weighted:
+        df["환산금액"] = df["환산금액"] * df["쉐어율"] / 100
+    df["계약일자"] = pd.to_datetime(df["계약일자"], errors="coerce")
+    for c in CATEGORY_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+
+    return df.drop(columns=["보험료"])
+
+
+def compute_manager_score(df_valid: pd.DataFrame, rules=None) -> pd.DataFrame:
+    return add_score_columns(df_valid.rename(columns=RENAME_COLUMNS), rules)
+
+
+def score_contracts(raw: pd.DataFrame, rules=None, prof=None):
+    """
+    ✅ 점수 커널: 정리 → 제외 판정 → 보험구분 → 환산을 한 번에
+    - 행 선택 1회 뒤 같은 프레임에 컬럼만 추가(중간 전체 복사 없음)
+    - prof(instrument.Profiler)를 주면 제외/점수 단계를 따로 기록
+    - 반환: (유효 계약 점수표, 제외 계약[제외사유 포함])
+    """
+    rules = rules or load_rules()
+    with stage(prof, "exclude_contracts", len(raw)) as rec:
+        valid, excluded = exclude_contracts(raw, rules)
+        rec["rows_out"] = len(valid)
+    with stage(prof, "compute_manager_score", len(valid)) as rec:
+        scored = compute_manager_score(valid, rules)
+        rec["rows_out"] = len(scored)
+    return scored, excluded
+
+
+# ── 요약/랭킹 ───────────────────────────────────────────────
+def aggregate_by_collector(df: pd.DataFrame) -> pd.DataFrame:
+    """수금자별 건수/실적보험료합계/환산금액합계(인덱스 = 수금자명, 범주형이 아닌 문자열)"""
+    agg = df.groupby("수금자명", dropna=False, observed=True).agg(
+        건수=("수금자명", "size"),
+        실적보험료합계=("실적보험료", "sum"),
+        환산금액합계=("환산금액", "sum"),
+    )
+    if isinstance(agg.index, pd.CategoricalIndex):
+        agg.index = agg.index.astype(agg.index.categories.dtype)
+    return agg
+
+
+def rank_collectors(agg: pd.DataFrame) -> pd.DataFrame:
+    """수금자별 합계 → dense 순위 + 정렬"""
+    group = agg.reset_index()
+
+    group["환산금액순위"] = group["환산금액합계"].rank(method="dense", ascending=False).astype(int)
+    group["건수순위"] = group["건수"].rank(method="dense", ascending=False).astype(int)
+
+    group = group[["환산금액순위", "건수순위", "수금자명", "건수", "실적보험료합계", "환산금액합계"]]
+    group = group.sort_values(["환산금액순위", "건수순위", "수금자명"]).reset_index(drop=True)
+    return group
+
+
+def make_group_with_ranks(df: pd.DataFrame) -> pd.DataFrame:
+    return rank_collectors(aggregate_by_collector(df))
+
+
+def collector_keys(names) -> np.ndarray:
+    """
+    수금자명 → 화면 선택/시트 분할에 쓰는 문자열 키(object 배열)
+    - 빈 수금자명은 'nan' (pandas 버전과 무관 — str dtype 의 astype(str) 은 빈 값을 그대로 둠)
+    """
+    return np.asarray(names, dtype=object).astype(str).astype(object)
+
+
+def select_collectors(agg: pd.DataFrame, selected) -> pd.DataFrame:
+    """
+    ✅ 업로드당 한 번 만든 수금자별 합계에서 선택된 수금자만
+    - 선택이 바뀌어도 계약 행을 다시 묶지 않음(수금자 수만큼만 계산)
+    """
+    return agg[np.isin(collector_keys(agg.index), list(selected))]
+
+
+def top3_tables(group: pd.DataFrame):
+    """
+    ✅ 동률 포함 TOP3
+    - 환산TOP3: [환산금액순위, 수금자명, 환산금액합계]
+    - 건수TOP3: [건수순위, 수금자명, 건수]
+    """
+    top_amt = group[group["환산금액순위"] <= 3].copy()
+    top_amt = top_amt.sort_values(["환산금액순위", "수금자명"])
+    top_amt = top_amt[["환산금액순위", "수금자명", "환산금액합계"]]
+
+    top_cnt = group[group["건수순위"] <= 3].copy()
+    top_cnt = top_cnt.sort_values(["건수순위", "수금자명"])
+    top_cnt = top_cnt[["건수순위", "수금자명", "건수"]]
+
+    return top_amt, top_cnt
+
+
+# ── 증분 재계산 ─────────────────────────────────────────────
+def build_state(file_hash: str, raw: pd.DataFrame, rules, scored: pd.DataFrame, excluded: pd.DataFrame,
+                keys=None, agg=None) -> ScoreState:
+    """점수 결과 → 다음 업로드와 비교할 상태(keys/agg 를 주면 다시 계산하지 않음)"""
+    keys, row_hashes = row_keys(raw) if keys is None else keys
+    return ScoreState(
+        file_hash=file_hash,
+        rules_fingerprint=rules.fingerprint,
+        raw=raw,
+        keys=keys,
+        row_hashes=row_hashes,
+        dtypes=raw_dtypes(raw),
+        scored=scored,
+        excluded=excluded,
+        agg=aggregate_by_collector(scored) if agg is None else agg,
+    )
+
+
+def update_aggregates(prev_agg: pd.DataFrame, scored: pd.DataFrame, touched) -> pd.DataFrame:
+    """
+    수금자별 합계 증분 갱신
+    - 추가/삭제/변경 행이 있는 수금자만 다시 합산, 나머지는 이전 합계 유지
+    - 다시 합산하는 수금자는 전체 행을 원본 순서로 더하므로 전체 재계산과 같은 값
+    """
+    touched = pd.Index(touched).unique()
+    fresh = aggregate_by_collector(scored[scored["수금자명"].isin(touched)])
+    parts = [p for p in (prev_agg.drop(touched, errors="ignore"), fresh) if not p.empty]
+    if not parts:
+        return fresh
+    # 이어 붙이면 다시 합산한 수금자가 뒤로 가므로 전체 재계산(groupby)과 같은 이름 순으로
+    return pd.concat(parts).sort_index() if len(parts) > 1 else parts[0]
+
+
+def collector_changes(prev_agg: pd.DataFrame, agg: pd.DataFrame) -> pd.DataFrame:
+    """
+    수금자별 변동(건수/환산금액/환산금액순위) — 달라진 수금자만
+    - 순위변동: 양수면 상승
+    """
+    prev_g = rank_collectors(prev_agg).set_index("수금자명")
+    new_g = rank_collectors(agg).set_index("수금자명")
+    j = new_g.join(prev_g, how="outer", rsuffix="_이전")
+
+    out = pd.DataFrame({
+        "건수": j["건수"].fillna(0).astype(int),
+        "건수증감": (j["건수"].fillna(0) - j["건수_이전"].fillna(0)).astype(int),
+        "환산금액합계": j["환산금액합계"].fillna(0),
+        "환산금액증감": j["환산금액합계"].fillna(0) - j["환산금액합계_이전"].fillna(0),
+        "환산금액순위": j["환산금액순위"].astype("Int64"),
+        "순위변동": (j["환산금액순위_이전"] - j["환산금액순위"]).astype("Int64"),
+    }, index=j.index)
+    moved = (out["건수증감"] != 0) | (out["환산금액증감"] != 0) | (out["순위변동"] != 0)
+    out = out[moved].reset_index()
+    return out.sort_values(["환산금액순위", "수금자명"], na_position="last").reset_index(drop=True)
+
+
+def rescore_incremental(prev: ScoreState, file_hash: str, raw: pd.DataFrame, rules):
+    """
+    ✅ 이전 업로드 결과에서 추가/삭제/변경 행만 반영
+    - 계약 키 해시로 행을 맞추고 내용 해시가 다른 행만 score_contracts
+    - 규칙/컬럼 dtype 이 바뀌었거나 키가 겹치면 전체 재계산
+    - 반환: (새 상태, 변경 요약 dict 또는 None)
+    """
+    keys = row_keys(raw)
+    diff = None
+    if prev.rules_fingerprint == rules.fingerprint and prev.dtypes == raw_dtypes(raw):
+        diff = diff_uploads(prev, *keys)
+    if diff is None:
+        scored, excluded = score_contracts(raw, rules)
+        return build_state(file_hash, raw, rules, scored, excluded, keys), None
+
+    delta_scored, delta_excluded = score_contracts(raw.iloc[diff.rescore], rules)
+    scored = merge_rows(prev.scored, delta_scored, diff)
+    excluded = merge_rows(prev.excluded, delta_excluded, diff)
+
+    dropped = prev.scored.index.to_numpy()
+    dropped = dropped[diff.new_pos_of_prev[dropped] < 0]
+    touched = pd.concat([prev.scored["수금자명"].loc[dropped], delta_scored["수금자명"]])
+
+    agg = update_aggregates(prev.agg, scored, touched)
+    state = build_state(file_hash, raw, rules, scored, excluded, keys, agg)
+
+    changes = {
+        "counts": diff.counts(),
+        "rescored": len(diff.rescore),
+        "collectors": collector_changes(prev.agg, state.agg),
+        "contracts": change_list(prev.raw, raw, diff),
+    }
+    return state, changes
+
+
+# ── 합계 ────────────────────────────────────────────────────
+def sums(agg: pd.DataFrame):
+    return float(agg["실적보험료합계"].sum()), float(agg["환산금액합계"].sum())
@@ -0,0 +1,294 @@
+"""
+세션/작업 프로세스가 함께 쓰는 결과 캐시(Streamlit 비의존)
+- 키: 업로드 내용 해시 + 규칙 지문(+ 저장 형식 버전) → 같은 파일은 누가 올려도 한 번만 읽기/환산/엑셀 생성
+- 2단: 메모리(프로세스 안 모든 세션 공유) → 디스크(공유 폴더, 작업 프로세스/서버 간 공유)
+- 단마다 용량 한도 + LRU 축출, TTL 지난 항목은 무효
+- 이름공간(읽기/합치기/환산/엑셀)별 적중(메모리·디스크)/미적중/축출 통계
+- 메모리 단의 값은 세션끼리 같은 객체를 공유하므로 꺼낸 뒤 제자리 수정 금지(pandas CoW 로 컬럼 대입은 안전)
+- 디스크 단은 pickle 이므로 서버만 쓰는 폴더를 지정
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from jobs import check_cancelled
+
+
+# ── 상수 ────────────────────────────────────────────────────
+RESULT_CACHE_DIR = os.environ.get(
+    "CONTRACT_RESULT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "results"),
+)
+MEMORY_BUDGET_MB = float(os.environ.get("CONTRACT_RESULT_CACHE_MEMORY_MB", 1024))
+DISK_BUDGET_MB = float(os.environ.get("CONTRACT_RESULT_CACHE_DISK_MB", 4096))
+TTL_SECONDS = float(os.environ.get("CONTRACT_RESULT_CACHE_TTL", 12 * 3600))
+
+RESULT_CACHE_VERSION = 1  # 점수표/결과 형식이 바뀌면 올림 → 기존 디스크 항목 무효
+
+# 다른 세션이 같은 키를 계산 중일 때 취소 여부를 확인하는 간격(초)
+WAIT_POLL_SECONDS = 0.1
+
+HIT_MEMORY = "메모리 적중"
+HIT_DISK = "디스크 적중"
+MISS = "미적중"
+EVICTED = "축출"
+EXPIRED = "만료"
+STAT_NAMES = (HIT_MEMORY, HIT_DISK, MISS, EVICTED, EXPIRED)
+
+_MISSING = object()
+
+
+# ── 유틸 ────────────────────────────────────────────────────
+def cache_key(namespace: str, *parts) -> str:
+    """이름공간 + 키 조각(문자열/숫자/목록) → 파일 이름으로도 쓰는 키"""
+    digest = hashlib.sha256(json.dumps(parts, ensure_ascii=False, default=str).encode()).hexdigest()[:32]
+    return f"{namespace}-{digest}-v{RESULT_CACHE_VERSION}"
+
+
+def value_nbytes(value) -> int:
+    """캐시 값 크기(바이트) — 표는 deep 메모리, bytes 는 길이, 튜플/목록은 합"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(value_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def dir_files(cache_dir: str, suffix: str) -> list:
+    """폴더 안 캐시 파일 [(경로, 바이트, 접근 시각, 저장 시각), ...]"""
+    files = []
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return files
+    for name in names:
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        files.append((path, st.st_size, st.st_atime, st.st_mtime))
+    return files
+
+
+def trim_dir(cache_dir: str, suffix: str, budget: int, ttl: float, on_remove=None):
+    """
+    캐시 폴더 정리: TTL 지난 파일 삭제 → 한도(바이트) 넘으면 오래 안 쓴(접근 시각) 파일부터 삭제
+    - 결과 캐시 디스크 단과 ingest 컬럼 캐시가 같은 규칙 사용
+    - on_remove(경로, EXPIRED/EVICTED): 지운 파일마다 호출(통계용)
+    """
+    now = time.time()
+    files = []
+    for f in dir_files(cache_dir, suffix):
+        if now - f[3] > ttl:
+            _remove(f[0], EXPIRED, on_remove)
+        else:
+            files.append(f)
+    total = sum(f[1] for f in files)
+    for path, size, _, _ in sorted(files, key=lambda f: f[2]):
+        if total <= budget:
+            break
+        _remove(path, EVICTED, on_remove)
+        total -= size
+
+
+def _remove(path: str, stat: str, on_remove=None):
+    try:
+        os.remove(path)
+    except OSError:
+        return  # 다른 프로세스가 먼저 지움
+    if on_remove is not None:
+        on_remove(path, stat)
+
+
+# ── 캐시 ────────────────────────────────────────────────────
+class ResultCache:
+    """
+    메모리 LRU + 디스크 LRU 결과 캐시
+    - get_or_compute(이름공간, 키 조각, 계산 함수): 메모리 → 디스크 → 계산 순서
+    - 같은 키를 여러 세션이 동시에 요청하면 한 세션만 계산하고 나머지는 그 키의 계산만 기다림
+      (계산 중에는 잠금을 잡지 않으므로 다른 키의 읽기/계산은 막히지 않음)
+    - 디스크 LRU 는 파일 접근 시각(atime, 적중 때 직접 갱신), TTL 은 파일 수정 시각(저장 시각) 기준
+    """
+
+    def __init__(self, cache_dir: str = RESULT_CACHE_DIR, memory_mb: float = MEMORY_BUDGET_MB,
+                 disk_mb: float = DISK_BUDGET_MB, ttl: float = TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.memory_budget = int(memory_mb * 2**20)
+        self.disk_budget = int(disk_mb * 2**20)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()    # 키 → (값, 바이트, 저장 시각), 앞쪽이 가장 오래 안 쓴 항목
+        self._memory_bytes = 0
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._inflight = {}              # 키 → 계산이 끝나면 켜지는 Event(계산 중인 키만)
+
+    def get_or_compute(self, namespace: str, parts, compute, disk: bool = True, cancel=None):
+        """
+        ✅ 캐시된 값 또는 compute() 결과
+        - disk=False: 메모리 단만 사용(이미 자체 디스크 캐시가 있는 단계)
+        - compute 가 예외를 내면 저장하지 않고 그대로 올림(기다리던 세션은 직접 다시 시도)
+        - cancel(threading.Event): 다른 세션의 계산을 기다리는 중에 켜지면 jobs.JobCancelled
+        """
+        key = cache_key(namespace, *parts)
+        value = self._memory_get(namespace, key)
+        if value is not _MISSING:
+            return value
+
+        while True:
+            with self._lock:
+                done = self._inflight.get(key)
+                if done is None:
+                    done = self._inflight[key] = threading.Event()
+                    break
+            while not done.wait(WAIT_POLL_SECONDS):
+                check_cancelled(cancel)
+            # 기다리는 동안 다른 세션이 채웠으면 그 값(메모리 한도보다 큰 값은 아래 디스크 단에서)
+            value = self._memory_get(namespace, key, count=False)
+            if value is not _MISSING:
+                self._count(namespace, HIT_MEMORY)
+                return value
+
+        try:
+            # 처음 확인한 뒤 다른 세션이 계산을 끝냈을 수 있으므로 다시 확인
+            value = self._memory_get(namespace, key, count=False)
+            if value is not _MISSING:
+                self._count(namespace, HIT_MEMORY)
+                return value
+            if disk:
+                value = self._disk_get(namespace, key)
+                if value is not _MISSING:
+                    self._count(namespace, HIT_DISK)
+                    self._memory_put(namespace, key, value)
+                    return value
+
+            self._count(namespace, MISS)
+            value = compute()
+            self._memory_put(namespace, key, value)
+            if disk:
+                self._disk_put(namespace, key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            done.set()
+
+    # ── 메모리 단 ───────────────────────────────────────────
+    def _memory_get(self, namespace: str, key: str, count: bool = True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, nbytes, stored = entry
+            if time.time() - stored > self.ttl:
+                del self._entries[key]
+                self._memory_bytes -= nbytes
+                self._count(namespace, EXPIRED)
+                return _MISSING
+            self._entries.move_to_end(key)
+        if count:
+            self._count(namespace, HIT_MEMORY)
+        return value
+
+    def _memory_put(self, namespace: str, key: str, value):
+        nbytes = value_nbytes(value)
+        if nbytes > self.memory_budget:
+            return  # 한도보다 큰 값은 메모리에 두지 않음(디스크 단만)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old[1]
+            self._entries[key] = (value, nbytes, time.time())
+            self._memory_bytes += nbytes
+            while self._memory_bytes > self.memory_budget and len(self._entries) > 1:
+                evicted, (_, size, _) = self._entries.popitem(last=False)
+                self._memory_bytes -= size
+                self._count(evicted.split("-", 1)[0], EVICTED)
+
+    # ── 디스크 단 ───────────────────────────────────────────
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _disk_get(self, namespace: str, key: str):
+        path = self._path(key)
+        try:
+            stored = os.stat(path).st_mtime
+            if time.time() - stored > self.ttl:
+                os.remove(path)
+                self._count(namespace, EXPIRED)
+                return _MISSING
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path, (time.time(), stored))  # LRU: 접근 시각만 갱신, 저장 시각 유지
+            return value
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # 없음 / 다른 프로세스가 지우는 중 / 깨진 파일 → 미적중
+            return _MISSING
+
+    def _disk_put(self, namespace: str, key: str, value):
+        """임시 파일 → rename(원자적 교체) 후 폴더를 한도 안으로 정리"""
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if os.path.getsize(tmp) > self.disk_budget:
+                os.remove(tmp)
+                return
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        trim_dir(self.cache_dir, ".pkl", self.disk_budget, self.ttl,
+                 lambda path, stat: self._count(os.path.basename(path).split("-", 1)[0], stat))
+
+    # ── 통계 ────────────────────────────────────────────────
+    def _count(self, namespace: str, stat: str):
+        with self._stats_lock:
+            counts = self._stats.setdefault(namespace, dict.fromkeys(STAT_NAMES, 0))
+            counts[stat] += 1
+
+    def stats(self) -> pd.DataFrame:
+        """이름공간별 적중/미적중/축출/만료 + 적중률(이 프로세스 시작 후 누적)"""
+        with self._stats_lock:
+            rows = [{"이름공간": ns, **counts} for ns, counts in sorted(self._stats.items())]
+        out = pd.DataFrame(rows, columns=["이름공간", *STAT_NAMES])
+        hits = out[HIT_MEMORY] + out[HIT_DISK]
+        out["적중률"] = (hits / (hits + out[MISS]).where(hits + out[MISS] > 0)).fillna(0.0)
+        return out
+
+    def usage(self) -> dict:
+        """현재 사용량: 메모리/디스크 항목 수와 MB, 한도 MB"""
+        with self._lock:
+            memory_entries, memory_bytes = len(self._entries), self._memory_bytes
+        files = dir_files(self.cache_dir, ".pkl")
+        return {
+            "memory_entries": memory_entries,
+            "memory_mb": memory_bytes / 2**20,
+            "memory_budget_mb": self.memory_budget / 2**20,
+            "disk_entries": len(files),
+            "disk_mb": sum(f[1] for f in files) / 2**20,
+            "disk_budget_mb": self.disk_budget / 2**20,
+        }
+
+
+# 프로세스당 하나(모든 Streamlit 세션이 공유)
+RESULT_CACHE = ResultCache()
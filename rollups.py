@@ -0,0 +1,147 @@
+"""
+기간별 실적 집계(Streamlit 비의존)
+- 업로드당 한 번 수금자 × 일 배열(건수/실적보험료/환산금액)을 만들고
+  기간 합계 · 일별/주별 추이 · 누적 환산금액 · 순위 변동은 모두 이 배열에서 계산(계약 행 다시 훑지 않음)
+- 계약일자가 날짜로 인식되지 않은 계약은 기간 집계에서 빠짐(건수는 undated 로 따로 보관)
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+# ── 상수 ────────────────────────────────────────────────────
+FREQ_DAY = "D"
+FREQ_WEEK = "W"  # 월요일 시작 주
+
+
+# ── 집계 배열 ───────────────────────────────────────────────
+@dataclass
+class DailyRollup:
+    """수금자 × 일 합계(행 = collectors 순서, 열 = start 부터 하루씩)"""
+    collectors: pd.Index             # 수금자명(문자열, 정렬)
+    start: np.datetime64             # 첫 날(날짜 있는 계약이 없으면 NaT)
+    count: np.ndarray                # (수금자, 일) int32 건수
+    perf: np.ndarray                 # (수금자, 일) float64 실적보험료
+    score: np.ndarray                # (수금자, 일) float64 환산금액
+    undated: int                     # 계약일자 없는 계약 수
+
+    @property
+    def empty(self) -> bool:
+        return self.count.shape[1] == 0
+
+    @property
+    def days(self) -> pd.DatetimeIndex:
+        return pd.date_range(self.start, periods=self.count.shape[1], freq="D") if not self.empty \
+            else pd.DatetimeIndex([])
+
+    @property
+    def bounds(self):
+        """(첫 날, 마지막 날) datetime.date"""
+        days = self.days
+        return days[0].date(), days[-1].date()
+
+    def _rows(self, collectors) -> np.ndarray:
+        pos = self.collectors.get_indexer(pd.Index(collectors, dtype=object).astype(str))
+        return pos[pos >= 0]
+
+    def _cols(self, start=None, end=None) -> slice:
+        """날짜 구간(양 끝 포함, None 이면 처음/끝) → 열 slice"""
+        n = self.count.shape[1]
+        lo = 0 if start is None else int((np.datetime64(pd.Timestamp(start).date()) - self.start).astype(int))
+        hi = n - 1 if end is None else int((np.datetime64(pd.Timestamp(end).date()) - self.start).astype(int))
+        return slice(min(max(lo, 0), n), min(max(hi + 1, 0), n))
+
+    def _periods(self, cols: slice, freq: str):
+        """열 구간 → (기간 시작 열 위치들, 기간 시작 날짜)"""
+        idx = np.arange(cols.start, cols.stop)
+        if freq == FREQ_WEEK:
+            week = (idx + pd.Timestamp(self.start).weekday()) // 7
+            starts = np.flatnonzero(np.r_[True, week[1:] != week[:-1]]) if len(idx) else idx
+            labels = self.days[idx[starts]] - pd.to_timedelta(self.days[idx[starts]].weekday, unit="D")
+        else:
+            starts = np.arange(len(idx))
+            labels = self.days[idx]
+        return starts, pd.DatetimeIndex(labels, name="기간")
+
+    def totals(self, collectors, start=None, end=None) -> pd.DataFrame:
+        """
+        ✅ 기간 합계 — aggregate_by_collector 와 같은 컬럼(인덱스 = 수금자명)
+        → pipeline.rank_collectors 에 그대로 넣어 기간 순위
+        """
+        rows, cols = self._rows(collectors), self._cols(start, end)
+        return pd.DataFrame({
+            "건수": self.count[rows, cols].sum(axis=1, dtype=np.int64),
+            "실적보험료합계": self.perf[rows, cols].sum(axis=1),
+            "환산금액합계": self.score[rows, cols].sum(axis=1),
+        }, index=pd.Index(self.collectors[rows], name="수금자명"))
+
+    def series(self, collectors, start=None, end=None, freq: str = FREQ_DAY, cumulative: bool = False,
+               column: str = "score") -> pd.DataFrame:
+        """
+        ✅ 기간별(일/주) 합계 또는 구간 시작부터의 누적 — 행 = 기간 시작일, 열 = 수금자명
+        - column: "score"(환산금액) / "perf"(실적보험료) / "count"(건수)
+        """
+        rows, cols = self._rows(collectors), self._cols(start, end)
+        starts, labels = self._periods(cols, freq)
+        values = getattr(self, column)[rows, cols]
+        sums = np.add.reduceat(values, starts, axis=1) if len(starts) else values[:, :0]
+        if cumulative:
+            sums = np.cumsum(sums, axis=1)
+        return pd.DataFrame(sums.T, index=labels, columns=pd.Index(self.collectors[rows], name="수금자명"))
+
+    def rank_history(self, collectors, start=None, end=None, freq: str = FREQ_DAY) -> pd.DataFrame:
+        """
+        기간 끝마다 누적 환산금액 dense 순위(주어진 수금자들 안에서, 1 = 최고)
+        - rank_collectors 의 환산금액순위와 같은 방식
+        """
+        cum = self.series(collectors, start, end, freq, cumulative=True)
+        ranks = np.empty(cum.shape, dtype=np.int32)
+        for j, values in enumerate(cum.to_numpy()):
+            _, inverse = np.unique(-values, return_inverse=True)
+            ranks[j] = inverse + 1
+        return pd.DataFrame(ranks, index=cum.index, columns=cum.columns)
+
+
+def build_rollup(scored: pd.DataFrame) -> DailyRollup:
+    """
+    ✅ 점수표 → 수금자 × 일 배열(업로드당 1회)
+    - 수금자·날짜를 (수금자 번호 × 일수 + 날짜 번호) 하나의 칸 번호로 만들어 bincount 한 번씩
+    """
+    groups = scored.groupby("수금자명", dropna=False, observed=True, sort=True)
+    codes = groups.ngroup().to_numpy()
+    names = groups.size().index
+    collectors = pd.Index(np.asarray(names, dtype=object).astype(str), name="수금자명")
+
+    days = scored["계약일자"].to_numpy().astype("datetime64[D]")
+    dated = ~np.isnat(days)
+    if not dated.any():
+        shape = (len(collectors), 0)
+        return DailyRollup(collectors, np.datetime64("NaT", "D"), np.zeros(shape, dtype=np.int32),
+                           np.zeros(shape), np.zeros(shape), int(len(scored)))
+
+    first = days[dated].min()
+    n_days = int((days[dated].max() - first).astype(int)) + 1
+    cell = codes[dated] * n_days + (days[dated] - first).astype(np.int64)
+    size, shape = len(collectors) * n_days, (len(collectors), n_days)
+
+    def cells(weights=None):
+        return np.bincount(cell, weights=weights, minlength=size).reshape(shape)
+
+    return DailyRollup(
+        collectors=collectors,
+        start=first,
+        count=cells().astype(np.int32),
+        perf=cells(scored["실적보험료"].to_numpy(dtype=np.float64)[dated]),
+        score=cells(scored["환산금액"].to_numpy(dtype=np.float64)[dated]),
+        undated=int((~dated).sum()),
+    )
+
+
+def rank_moves(ranks: pd.DataFrame) -> pd.DataFrame:
+    """순위 변동 표: 구간 첫 기간 순위 → 마지막 기간 순위(변동 양수 = 상승)"""
+    if ranks.empty:
+        return pd.DataFrame(columns=["수금자명", "시작순위", "현재순위", "순위변동"])
+    first, last = ranks.iloc[0], ranks.iloc[-1]
+    out = pd.DataFrame({"시작순위": first, "현재순위": last, "순위변동": first - last}).reset_index()
+    return out.sort_values(["현재순위", "수금자명"]).reset_index(drop=True)
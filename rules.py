@@ -0,0 +1,198 @@
+"""
+환산 규칙 엔진(Streamlit 비의존)
+- 규칙 파일(rules.json): 제외 조건 / 보험구분 / 납입기간 구간별 환산율 / 보험사별 예외 / 쉐어율 가중
+- 한 번 컴파일해 (보험사 행 × 납입기간 구간) 환산율 표로 만들고, 전체 행에 인덱싱 한 번으로 적용
+- 컴파일 결과는 (파일 경로, 수정 시각) 단위로 캐시 → Streamlit 재실행 사이에도 재사용
+"""
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+# ── 기본 규칙(규칙 파일이 없을 때) ───────────────────────────
+DEFAULT_RULES = {
+    "version": "기본",
+    # 제외 조건: column 값(strip)에 pattern(정규식)이 있으면 제외, label 은 제외사유 표시
+    "exclusions": [
+        {"label": "일시납", "column": "납입방법", "pattern": "일시납"},
+        {"label": "연금/저축성", "column": "상품군2", "pattern": "연금성|저축성"},
+        {"label": "철회", "column": "계약상태", "pattern": "철회"},
+        {"label": "해약", "column": "계약상태", "pattern": "해약"},
+        {"label": "실효", "column": "계약상태", "pattern": "실효"},
+    ],
+    # 보험구분: 보험사명에 pattern 이 있으면 type(위에서부터 첫 일치), 없으면 default_insurer_type
+    "insurer_types": [
+        {"type": "손해보험", "pattern": "손해|손보|화재|해상"},
+    ],
+    "default_insurer_type": "생명보험",
+    # 납입기간 구간 하한(년): [0, 10] → 10년납 미만 / 10년납 이상
+    "term_tiers": [0, 10],
+    # 보험구분별 구간 환산율(%) — term_tiers 와 같은 길이
+    "rates": {
+        "생명보험": [50, 80],
+        "손해보험": [50, 150],
+    },
+    # 보험사별 예외(위에서부터 첫 일치): {"pattern": "메리츠", "rates": [60, 160]}
+    "insurer_overrides": [],
+    # true 면 환산금액에 쉐어율(%)을 곱함
+    "share_weighted": False,
+}
+
+RULES_PATH = os.environ.get(
+    "RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"),
+)
+
+
+# ── 컴파일된 규칙 ───────────────────────────────────────────
+@dataclass(frozen=True)
+class CompiledRules:
+    fingerprint: str                 # 규칙 내용 해시(캐시 키에 포함)
+    version: str
+    exclusions: tuple                # ((label, column, pattern), ...)
+    insurer_types: tuple             # ((type, pattern), ...)
+    default_insurer_type: str
+    type_names: tuple                # 환산율 표 행 순서: 보험구분들 + 예외 보험사들
+    override_patterns: tuple
+    bounds: np.ndarray               # 납입기간 구간 하한
+    rate_table: np.ndarray           # (행, 구간) 환산율
+    share_weighted: bool
+    _insurers: dict = field(default_factory=dict, compare=False, repr=False)
+
+    @property
+    def exclusion_labels(self) -> list:
+        return [label for label, _, _ in self.exclusions]
+
+    @property
+    def exclusion_columns(self) -> list:
+        return list(dict.fromkeys(column for _, column, _ in self.exclusions))
+
+    def insurer(self, name: str) -> tuple:
+        """보험사명 → (보험구분, 환산율 표 행) — 보험사 종류별 1회만 판정"""
+        hit = self._insurers.get(name)
+        if hit is None:
+            s = name.strip()
+            type_name = next((t for t, p in self.insurer_types if re.search(p, s)), self.default_insurer_type)
+            row = self.type_names.index(type_name)
+            for i, p in enumerate(self.override_patterns):
+                if re.search(p, s):
+                    row = len(self.type_names) - len(self.override_patterns) + i
+                    break
+            hit = self._insurers[name] = (type_name, row)
+        return hit
+
+    def classify(self, insurers: pd.Series):
+        """보험사 컬럼 → (보험구분 배열, 환산율 표 행 배열)"""
+        codes, uniques = pd.factorize(insurers)
+        # 코드 -1(빈 값)은 마지막 칸 = 기본 보험구분
+        hits = [self.insurer(str(u)) for u in uniques]
+        hits.append((self.default_insurer_type, self.type_names.index(self.default_insurer_type)))
+        types = np.array([t for t, _ in hits], dtype=object)
+        rows = np.array([r for _, r in hits], dtype=np.int64)
+        return types[codes], rows[codes]
+
+    def rates(self, term: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """납입기간(년) × 표 행 → 환산율(첫 구간 하한 미만은 첫 구간)"""
+        bucket = np.searchsorted(self.bounds, term, side="right") - 1
+        return self.rate_table[rows, np.clip(bucket, 0, None)]
+
+    def describe(self) -> list:
+        """사이드바 표시용 '구간(구분): 환산율' 목록"""
+        labels = []
+        for j, lo in enumerate(self.bounds):
+            hi = self.bounds[j + 1] if j + 1 < len(self.bounds) else None
+            labels.append(f"{hi}년납 미만" if j == 0 and hi is not None else
+                          f"{lo}~{hi - 1}년납" if hi is not None else f"{lo}년납 이상")
+        lines = []
+        for j, term_label in enumerate(labels):
+            per_type = {}
+            for i, name in enumerate(self.type_names):
+                per_type.setdefault(_fmt_rate(self.rate_table[i, j]), []).append(name)
+            if len(per_type) == 1:
+                lines.append(f"{term_label}: **{next(iter(per_type))}%**")
+            else:
+                lines += [f"{term_label}({', '.join(names)}): **{rate}%**" for rate, names in per_type.items()]
+        if self.share_weighted:
+            lines.append("환산금액 × 쉐어율")
+        return lines
+
+
+def _fmt_rate(x) -> str:
+    return f"{x:g}"
+
+
+def compile_rules(spec: dict) -> CompiledRules:
+    """규칙 dict 검증 + 환산율 표 생성(잘못된 규칙은 ValueError)"""
+    bounds = [int(b) for b in spec["term_tiers"]]
+    if not bounds or bounds != sorted(set(bounds)):
+        raise ValueError("term_tiers 는 중복 없는 오름차순이어야 합니다.")
+
+    exclusions = tuple((e["label"], e["column"], e["pattern"]) for e in spec.get("exclusions", []))
+    if len(exclusions) > 60:
+        raise ValueError("제외 조건은 60개까지 지정할 수 있습니다.")
+    for _, _, pattern in exclusions:
+        re.compile(pattern)
+
+    insurer_types = tuple((t["type"], t["pattern"]) for t in spec.get("insurer_types", []))
+    default_type = spec["default_insurer_type"]
+    rates = spec["rates"]
+    type_names = list(dict.fromkeys([*(t for t, _ in insurer_types), default_type]))
+    rows = []
+    for name in type_names:
+        if name not in rates:
+            raise ValueError(f"rates 에 '{name}' 환산율이 없습니다.")
+        rows.append(rates[name])
+
+    overrides = spec.get("insurer_overrides", [])
+    override_patterns = tuple(o["pattern"] for o in overrides)
+    rows += [o["rates"] for o in overrides]
+    for p in (*(p for _, p in insurer_types), *override_patterns):
+        re.compile(p)
+
+    if any(len(r) != len(bounds) for r in rows):
+        raise ValueError("환산율 목록 길이는 term_tiers 와 같아야 합니다.")
+    table = np.array(rows, dtype=np.float64)
+    if np.all(table == np.round(table)):
+        # 정수 환산율은 값 범위에 맞는 가장 작은 부호 있는 정수(점수표 환산율 컬럼 크기)
+        lo, hi = (np.min_scalar_type(int(v)) for v in (table.min(), table.max()))
+        table = table.astype(np.result_type(np.int8, lo, hi))
+
+    canonical = json.dumps(spec, ensure_ascii=False, sort_keys=True)
+    return CompiledRules(
+        fingerprint=hashlib.sha256(canonical.encode()).hexdigest()[:12],
+        version=str(spec.get("version", "")),
+        exclusions=exclusions,
+        insurer_types=insurer_types,
+        default_insurer_type=default_type,
+        type_names=tuple(type_names) + tuple(f"예외:{p}" for p in override_patterns),
+        override_patterns=override_patterns,
+        bounds=np.array(bounds, dtype=np.int64),
+        rate_table=table,
+        share_weighted=bool(spec.get("share_weighted", False)),
+    )
+
+
+@lru_cache(maxsize=8)
+def _compile_file(path: str, mtime_ns: int) -> CompiledRules:
+    with open(path, encoding="utf-8") as f:
+        return compile_rules(json.load(f))
+
+
+def load_rules(path: str = RULES_PATH) -> CompiledRules:
+    """규칙 파일 로드(파일이 바뀌면 다시 컴파일, 없으면 DEFAULT_RULES)"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return _default_rules()
+    return _compile_file(os.path.abspath(path), mtime_ns)
+
+
+@lru_cache(maxsize=1)
+def _default_rules() -> CompiledRules:
+    return compile_rules(DEFAULT_RULES)
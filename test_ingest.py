@@ -0,0 +1,157 @@
+"""
+ingest.py 점검 — 빠른 경로(read_xlsx_columns) / 기존 리더(pd.read_excel) / 디스크 캐시 왕복 비교
+- 실행: python -m pytest test_ingest.py
+"""
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ingest import (
+    COLUMNS_NEEDED, NS_PKG_REL, cache_key, pa, read_cached, read_excel_fallback, read_xlsx_columns,
+    write_cached,
+)
+
+SAMPLE = Path(__file__).with_name("최종 contract_data.xlsx")
+
+
+# ── 점검용 파일 ─────────────────────────────────────────────
+def _fixture_cell(ref: str, value) -> str:
+    """
+    점검용 셀 XML — value: None(빈 셀) 또는 (종류, 값)
+    - s: 공유 문자열 번호 / i: 인라인 문자열 / r: 서식 run 인라인 문자열 / d: 날짜 서식 숫자
+    - n: 숫자 원문 / x: 속성+내용 원문(' t="e"><v>#N/A</v>' 처럼)
+    """
+    attr = f' r="{ref}"' if ref else ""
+    if value is None:
+        return f"<c{attr}/>"
+    kind, v = value
+    if kind == "s":
+        return f'<c{attr} t="s"><v>{v}</v></c>'
+    if kind == "i":
+        return f'<c{attr} t="inlineStr"><is><t>{v}</t></is></c>'
+    if kind == "r":
+        return f'<c{attr} t="inlineStr"><is>{v}</is></c>'
+    if kind == "d":
+        return f'<c{attr} s="1"><v>{v}</v></c>'
+    if kind == "n":
+        return f"<c{attr}><v>{v}</v></c>"
+    return f"<c{attr}{v}</c>"
+
+
+def _parity_fixture() -> bytes:
+    """
+    빠른 경로 점검용 계약 목록(.xlsx) — 두 리더가 실제 행을 읽어 비교하도록
+    - 공유 문자열 / 인라인 문자열(서식 run 포함) / 날짜 서식 숫자 / ISO 날짜(t="d") / 오류 셀
+    - 빈 셀·빠진 셀(NaN), 좌표(r) 없는 셀, 건너뛴 행, 필요 없는 열(비고)만 값이 있는 행
+    - 끝에 서식만 있는 빈 행(pandas 가 잘라내는 행)
+    """
+    shared = ["수금자명", "계약일", "보험사", "상품명", "납입기간", "초회보험료", "쉐어율", "납입방법",
+              "상품군2", "계약상태", "비고", "홍길동", "한화생명", "DB손해보험", "종신보험", "100%",
+              "월납", "보장성", "정상", "50%", "일시납", "연금성", "해약"]
+    sid = {text: i for i, text in enumerate(shared)}
+    header = ["수금자명", "비고", "계약일", "보험사", "상품명", "납입기간", "초회보험료", "쉐어율", "납입방법",
+              "상품군2", "계약상태"]
+    letters = "ABCDEFGHIJK"
+
+    def s(text):
+        return ("s", sid[text])
+
+    rows = [
+        (1, [s(h) for h in header]),
+        (2, [s("홍길동"), None, ("d", 45839), s("한화생명"), s("종신보험"), ("n", 20), ("n", 150000),
+             s("100%"), s("월납"), s("보장성"), s("정상")]),
+        (3, [("i", "김 철수"), ("i", "메모"), ("d", 45840.5), s("DB손해보험"),
+             ("r", "<r><t>건강</t></r><r><rPr><b/></rPr><t>보험</t></r>"), ("n", 7), ("n", "1.2E5"),
+             s("50%"), s("월납"), s("보장성"), s("해약")]),
+        (4, [s("홍길동"), None, ("x", ' t="d"><v>2025-07-03T00:00:00</v>'), s("한화생명"), s("종신보험"),
+             ("n", "10.0"), None, None, s("일시납"), s("연금성"), s("정상")]),
+        (5, [("i", "이영희"), None, ("x", ' t="e"><v>#N/A</v>'), ("i", "삼성화재"), s("종신보험"),
+             ("x", ' t="str"><v>12</v>'), ("n", 88000.5), ("i", "70%"), s("월납"), s("보장성"), s("정상")]),
+        # 6행 건너뜀(빈 행)
+        (7, [None, ("i", "비고만 있는 행")] + [None] * 9),
+        (8, [s("홍길동"), None, ("d", 45900), s("한화생명"), s("종신보험"), ("n", 5), ("n", 30000),
+             s("100%"), s("월납"), s("보장성"), s("정상")]),
+    ]
+    sheet_rows = []
+    for r, cells in rows:
+        if r == 8:
+            # 좌표 없는 셀(순서대로 다음 열)
+            xml = [_fixture_cell("", value) for value in cells]
+        else:
+            xml = [_fixture_cell(f"{letters[c]}{r}", value) for c, value in enumerate(cells) if value is not None]
+        sheet_rows.append(f'<row r="{r}">{"".join(xml)}</row>')
+    # 끝의 서식만 있는 빈 행
+    sheet_rows += [f'<row r="{r}"><c r="A{r}" s="1"/><c r="G{r}" s="1"/></row>' for r in (9, 10, 11)]
+
+    main = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    parts = {
+        "[Content_Types].xml": (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            '</Types>'),
+        "_rels/.rels": (
+            f'<Relationships xmlns="{NS_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{rel}/officeDocument" Target="xl/workbook.xml"/></Relationships>'),
+        "xl/workbook.xml": (
+            f'<workbook {main} xmlns:r="{rel}"><sheets>'
+            '<sheet name="계약목록" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+        "xl/_rels/workbook.xml.rels": (
+            f'<Relationships xmlns="{NS_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{rel}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{rel}/styles" Target="styles.xml"/>'
+            f'<Relationship Id="rId3" Type="{rel}/sharedStrings" Target="sharedStrings.xml"/></Relationships>'),
+        "xl/styles.xml": (
+            f'<styleSheet {main}><fonts count="1"><font/></fonts>'
+            '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+            '<borders count="1"><border/></borders><cellStyleXfs count="1"><xf/></cellStyleXfs>'
+            '<cellXfs count="2"><xf numFmtId="0"/><xf numFmtId="14" applyNumberFormat="1"/></cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'),
+        "xl/sharedStrings.xml": (
+            f'<sst {main} count="{len(shared)}" uniqueCount="{len(shared)}">'
+            + "".join(f"<si><t>{text}</t></si>" for text in shared) + "</sst>"),
+        "xl/worksheets/sheet1.xml": f'<worksheet {main}><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>',
+    }
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in parts.items():
+            zf.writestr(name, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xml)
+    return buf.getvalue()
+
+
+# ── 점검 ────────────────────────────────────────────────────
+def test_fixture_parity(tmp_path):
+    """실제 행이 있는 점검용 파일: 두 리더 결과와 Arrow 캐시 왕복 결과가 모두 같아야 함"""
+    file_bytes = _parity_fixture()
+    fast = read_xlsx_columns(file_bytes, COLUMNS_NEEDED)
+    slow = read_excel_fallback(file_bytes, COLUMNS_NEEDED)
+    assert fast.shape == (7, len(COLUMNS_NEEDED))
+    pd.testing.assert_frame_equal(fast, slow)
+
+    if pa is None:
+        pytest.skip("pyarrow 없음 — 디스크 캐시 왕복 생략")
+    key = cache_key(file_bytes, COLUMNS_NEEDED)
+    assert write_cached(key, fast, str(tmp_path))
+    pd.testing.assert_frame_equal(read_cached(key, str(tmp_path)), fast)
+
+
+@pytest.mark.skipif(not SAMPLE.exists(), reason="샘플 파일 없음")
+def test_sample_template_rejected_by_both_readers():
+    """동봉 샘플(헤더만 있는 양식)은 필요한 컬럼이 없어 두 리더가 모두 거부 → 대체 경로도 같은 오류"""
+    file_bytes = SAMPLE.read_bytes()
+    with pytest.raises(Exception):
+        read_excel_fallback(file_bytes, COLUMNS_NEEDED)
+    with pytest.raises(Exception):
+        read_xlsx_columns(file_bytes, COLUMNS_NEEDED)
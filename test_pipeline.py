@@ -0,0 +1,62 @@
+"""
+pipeline.py 점검 — 증분 재계산 결과를 전체 재계산 결과와 비교, 여러 지점 파일 합치기
+- 실행: python -m pytest test_pipeline.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench import generate_contracts
+from pipeline import aggregate_by_collector, build_state, merge_contracts, rescore_incremental, score_contracts
+from rules import load_rules
+
+
+def _next_day(day1: pd.DataFrame, seed: int) -> pd.DataFrame:
+    """합성 계약 목록의 하루치 변동: 삭제 / 보험료·상태 변경 / 새 수금자 / 수금자 퇴사"""
+    rng = np.random.default_rng(seed)
+    day2 = day1.drop(index=rng.choice(len(day1), 60, replace=False))
+    changed = rng.choice(day2.index, 40, replace=False)
+    day2.loc[changed[:20], "초회보험료"] = 990_000
+    day2.loc[changed[20:], "계약상태"] = "해약"
+    joined = generate_contracts(80, collectors=2, seed=seed + 100)
+    joined["수금자명"] = joined["수금자명"].map({"수금자0000": "가신입", "수금자0001": "수금자9999"})
+    day2 = day2[day2["수금자명"] != "수금자0003"]
+    return pd.concat([day2, joined], ignore_index=True)
+
+
+# ── 증분 재계산 ─────────────────────────────────────────────
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_matches_full_rescore(seed):
+    """점수표 / 제외 계약 / 수금자별 합계(순서 포함)까지 전체 재계산과 같아야 함"""
+    rules = load_rules()
+    day1 = generate_contracts(3_000, collectors=20, seed=seed)
+    day2 = _next_day(day1, seed)
+
+    prev_scored, prev_excluded = score_contracts(day1, rules)
+    prev = build_state("prev", day1, rules, prev_scored, prev_excluded)
+    state, changes = rescore_incremental(prev, "new", day2, rules)
+    assert changes is not None, "증분 경로를 타지 않음(전체 재계산)"
+
+    scored, excluded = score_contracts(day2, rules)
+    pd.testing.assert_frame_equal(state.scored, scored)
+    pd.testing.assert_frame_equal(state.excluded, excluded)
+    pd.testing.assert_frame_equal(state.agg, aggregate_by_collector(scored))
+
+
+# ── 여러 파일 합치기 ────────────────────────────────────────
+def test_merge_dedups_across_dtypes():
+    """
+    파일마다 dtype 이 달라도 같은 계약은 중복으로 뺌
+    - B: A 의 앞 50행 + 보험료 빈 행 1개(초회보험료 int64 → float64), 계약일은 문자열, 수금자명 끝에 공백
+    """
+    a = generate_contracts(100, collectors=5, seed=1)
+    b = a.iloc[:51].copy()
+    b.loc[50, "초회보험료"] = None
+    b["계약일"] = b["계약일"].dt.strftime("%Y-%m-%d")
+    b["수금자명"] = b["수금자명"] + " "
+    assert b["초회보험료"].dtype == np.float64
+
+    merged, stats = merge_contracts([("A", a), ("B", b)])
+    assert stats["반영"].tolist() == [100, 1]
+    assert stats["중복"].tolist() == [0, 50]
+    assert len(merged) == 101